@@ -0,0 +1,134 @@
+import collections
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+# === SYNTHESIZED SPEECH CACHE ===
+# Content-addressed: each clip is stored under a hash of (engine, language,
+# text), so replaying a message is a file read instead of another synthesis
+# round-trip. Total size is capped and the least recently played clips are
+# evicted first.
+
+logger = logging.getLogger(__name__)
+
+FILE_SUFFIX = ".audio"
+
+
+def cache_key(text, lang, engine):
+    return hashlib.sha256(f"{engine}\0{lang}\0{text}".encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> size, least recently used first
+        self._index = collections.OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    # Rebuild the LRU order from file access times left by a previous process
+    def _load_index(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(FILE_SUFFIX):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            files.append((stat.st_mtime, name[:-len(FILE_SUFFIX)], stat.st_size))
+        for _, key, size in sorted(files):
+            self._index[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + FILE_SUFFIX)
+
+    def get(self, text, lang, engine):
+        found = self.get_any(text, lang, [engine])
+        return found[1] if found else None
+
+    # Look for a clip from any of `engines`, in order, counting one hit or
+    # miss for the whole lookup. Returns (engine, audio) or None.
+    def get_any(self, text, lang, engines):
+        for engine in engines:
+            audio = self._read(cache_key(text, lang, engine))
+            if audio is not None:
+                with self._lock:
+                    self.hits += 1
+                return engine, audio
+        with self._lock:
+            self.misses += 1
+        return None
+
+    # The clip stored under `key`, or None. Doesn't touch the hit counts.
+    def _read(self, key):
+        with self._lock:
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        try:
+            path = self._path(key)
+            os.utime(path)  # Keeps the LRU order across restarts
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            # Removed behind our back - treat as not cached
+            with self._lock:
+                self._forget(key)
+            return None
+
+    def put(self, text, lang, engine, audio):
+        if len(audio) > self.max_bytes:
+            return
+        key = cache_key(text, lang, engine)
+        # Write to a temp file first so a reader never sees a partial clip
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning("Could not cache audio: %s", e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self._forget(key)
+            self._index[key] = len(audio)
+            self._total_bytes += len(audio)
+            self._evict()
+
+    def _forget(self, key):
+        size = self._index.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1 @@
+# Benchmarks for the journal database workloads - see benchmarks/run.py
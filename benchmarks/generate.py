@@ -0,0 +1,99 @@
+import datetime
+import os
+import random
+
+import journal_db
+
+# === SYNTHETIC JOURNAL ===
+# Deterministic journal entries for benchmarking: the same size and seed
+# always produce the same database. Entries are spread back from END_DATE
+# over journaled days with occasional gaps of several days (so streaks of
+# varying length exist), times of day weighted towards mornings and evenings,
+# the app's mood labels and comma-separated tags. Small journals average two
+# entries a day; past MAX_JOURNALED_DAYS the days just get busier.
+
+END_DATE = datetime.datetime(2025, 1, 1)
+MAX_JOURNALED_DAYS = 3000
+
+MOODS = ["😄 Great", "🙂 Okay", "😐 Neutral", "😔 Low", "😣 Anxious",
+         "😊 Happy", "😌 Relaxed", "😟 Worried", "😠 Angry", "😴 Tired"]
+MOOD_WEIGHTS = [8, 20, 15, 8, 6, 14, 9, 8, 4, 8]
+
+TAGS = ["study", "focus", "progress", "exam", "work", "family", "friends", "health", "gym", "sleep",
+        "reading", "recovery", "meditation", "travel", "money", "goals", "habits", "mood", "ca-finals", "rest"]
+
+SUBJECTS = ["I", "Today I", "This morning I", "Tonight I", "After lunch I", "Before bed I"]
+VERBS = ["studied", "worked on", "thought about", "struggled with", "finished", "started", "reviewed",
+         "talked about", "planned", "avoided", "enjoyed", "practised"]
+OBJECTS = ["accounting standards", "the audit chapter", "my study plan", "a long walk", "taxation problems",
+           "a call with mom", "the gym routine", "my sleep schedule", "a mock exam", "costing questions",
+           "the budget for this month", "a book about habits", "dinner with friends", "my focus", "revision notes"]
+ENDINGS = ["and it went better than expected.", "but I got distracted a lot.", "for about two hours.",
+           "and I feel more confident now.", "which left me tired.", "and want to do it again tomorrow.",
+           "even though I didn't feel like it.", "and noticed I was calmer afterwards."]
+
+# Hour of day weights, 0-23
+HOUR_WEIGHTS = [1, 1, 0, 0, 0, 1, 3, 6, 6, 4, 3, 3, 3, 3, 3, 3, 3, 4, 5, 6, 8, 9, 7, 3]
+
+
+def _entry_text(rng):
+    sentences = [
+        f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)} {rng.choice(ENDINGS)}"
+        for _ in range(rng.randint(2, 8))
+    ]
+    return " ".join(sentences)
+
+
+# Yields (timestamp, entry, mood, tags, reflection) oldest first
+def generate_entries(count, seed=0):
+    rng = random.Random(seed)
+    # Pick the journaled days walking back from END_DATE, at most
+    # MAX_JOURNALED_DAYS of them so large sizes stay within a decade or so
+    n_days = min(-(-count // 2), MAX_JOURNALED_DAYS)
+    days = []
+    day = END_DATE.date()
+    while len(days) < n_days:
+        days.append(day)
+        # Mostly consecutive days, sometimes a break of up to two weeks
+        day -= datetime.timedelta(days=1 if rng.random() < 0.8 else rng.randint(2, 14))
+    days.reverse()
+    # One entry on every journaled day, the rest spread unevenly over them
+    per_day = [1] * n_days
+    weights = rng.choices([1, 2, 4, 8], weights=[55, 25, 15, 5], k=n_days)
+    for i in rng.choices(range(n_days), weights=weights, k=count - n_days):
+        per_day[i] += 1
+    for day, entries in zip(days, per_day):
+        hours = sorted(rng.choices(range(24), weights=HOUR_WEIGHTS, k=entries))
+        for hour in hours:
+            timestamp = datetime.datetime.combine(day, datetime.time(hour, rng.randrange(60), rng.randrange(60)))
+            tags = ", ".join(rng.sample(TAGS, rng.randint(0, 3)))
+            yield (timestamp.strftime("%Y-%m-%d %H:%M:%S"), _entry_text(rng),
+                   rng.choices(MOODS, weights=MOOD_WEIGHTS)[0], tags, None)
+
+
+# Create (or reuse) a database at `path` holding `count` generated entries
+def build_database(path, count, seed=0, batch_size=5000):
+    if os.path.exists(path):
+        return path
+    tmp_path = path + ".tmp"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(tmp_path + suffix):
+            os.remove(tmp_path + suffix)
+    pool = journal_db.ConnectionPool(tmp_path, size=1)
+    try:
+        journal_db.init_db(pool)
+        batch = []
+        for row in generate_entries(count, seed):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                journal_db.insert_entries(pool, batch)
+                batch = []
+        if batch:
+            journal_db.insert_entries(pool, batch)
+        journal_db.refresh_activity(pool)
+        with pool.connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        pool.close()
+    os.replace(tmp_path, path)
+    return path
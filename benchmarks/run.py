@@ -0,0 +1,162 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import journal_db
+from benchmarks import generate, workloads
+
+# === BENCHMARK RUNNER ===
+# Times every workload against generated databases of each size and writes
+# the results as JSON, so runs from different versions can be compared:
+#
+#   python -m benchmarks.run --sizes 1000 10000 --output before.json
+#   python -m benchmarks.run --sizes 1000 10000 --output after.json --compare before.json
+#
+# Generated databases are kept in benchmarks/data and reused; each run works
+# on a fresh copy so the insert workload never changes them.
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_REPEAT = 20
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+# A workload counts as a regression when its median is this much slower, and
+# by more than REGRESSION_MIN_MS (so timer noise on sub-millisecond queries
+# isn't reported)
+REGRESSION_RATIO = 1.2
+REGRESSION_MIN_MS = 0.1
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _summary(timings):
+    timings = sorted(timings)
+    ms = [t * 1000 for t in timings]
+    return {
+        "runs": len(ms),
+        "min_ms": ms[0],
+        "median_ms": statistics.median(ms),
+        "mean_ms": statistics.fmean(ms),
+        "p95_ms": ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+        "max_ms": ms[-1],
+    }
+
+
+# Time each workload `repeat` times (after one warm-up call) on a copy of the
+# database. Returns a list of result dicts.
+def run_size(size, repeat, seed=0, only=None):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    source = os.path.join(DATA_DIR, f"journal_{size}_seed{seed}.db")
+    if not os.path.exists(source):
+        print(f"Generating {size:,} entries...", flush=True)
+        start = time.perf_counter()
+        generate.build_database(source, size, seed)
+        print(f"  done in {time.perf_counter() - start:.1f}s", flush=True)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "journal.db")
+        shutil.copyfile(source, path)
+        pool = journal_db.ConnectionPool(path, size=1)
+        try:
+            journal_db.init_db(pool)
+            for name, run, setup, requires in workloads.WORKLOADS:
+                if only and name not in only:
+                    continue
+                result = {"size": size, "workload": name}
+                if requires and not workloads.has_module(requires):
+                    result["skipped"] = f"{requires} is not installed"
+                    results.append(result)
+                    print(f"  {name:<32} skipped ({result['skipped']})", flush=True)
+                    continue
+                state = {}
+                if setup:
+                    setup(pool, state)
+                run(pool, state)  # Warm-up: statement cache, page cache
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    run(pool, state)
+                    timings.append(time.perf_counter() - start)
+                result.update(_summary(timings))
+                results.append(result)
+                print(f"  {name:<32} median {result['median_ms']:9.3f} ms   p95 {result['p95_ms']:9.3f} ms",
+                      flush=True)
+        finally:
+            pool.close()
+    return results
+
+
+# Print each workload's median against a previous results file. Returns the
+# number of regressions found.
+def compare(results, previous):
+    before = {(r["size"], r["workload"]): r for r in previous["results"] if "median_ms" in r}
+    regressions = 0
+    print(f"\nCompared with {previous['meta'].get('git_commit') or 'previous run'}:")
+    for result in results:
+        old = before.get((result["size"], result["workload"]))
+        if not old or "median_ms" not in result:
+            continue
+        ratio = result["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+        flag = ""
+        if ratio > REGRESSION_RATIO and result["median_ms"] - old["median_ms"] > REGRESSION_MIN_MS:
+            flag = "  <-- slower"
+            regressions += 1
+        print(f"  {result['size']:>9,} {result['workload']:<32} {old['median_ms']:9.3f} -> "
+              f"{result['median_ms']:9.3f} ms  ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app's database workloads on synthetic journals.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="journal sizes in entries (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="timed runs per workload (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="generator seed (default: %(default)s)")
+    parser.add_argument("--workloads", nargs="+", choices=[w[0] for w in workloads.WORKLOADS],
+                        help="only run these workloads")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="results file to write (default: %(default)s)")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    meta = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+    }
+    results = []
+    for size in args.sizes:
+        print(f"{size:,} entries", flush=True)
+        results.extend(run_size(size, args.repeat, args.seed, args.workloads))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2, ensure_ascii=False)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            if compare(results, json.load(f)):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import datetime
+import importlib.util
+
+import journal_db
+from benchmarks import generate
+
+# === WORKLOADS ===
+# Each workload is the query or call the app makes for one piece of a page,
+# run against a pool on the benchmark database. The legacy_* workloads are the
+# queries the app used before the activity rollup, the indexed filters and
+# FTS search, kept so the before/after cost can be compared at each size.
+
+LEGACY_STREAK_CTE = """
+WITH dates AS (
+    SELECT date(timestamp) as entry_date
+    FROM journal_entries
+    ORDER BY timestamp DESC
+),
+grouped AS (
+    SELECT
+        entry_date,
+        julianday(entry_date) - julianday(LAG(entry_date) OVER (ORDER BY entry_date DESC)) as day_diff
+    FROM dates
+),
+streaks AS (
+    SELECT
+        entry_date,
+        SUM(CASE WHEN day_diff = 1 THEN 0 ELSE 1 END) OVER (ORDER BY entry_date DESC) as streak_group
+    FROM grouped
+)
+"""
+
+LEGACY_CURRENT_STREAK = LEGACY_STREAK_CTE + """
+SELECT COUNT(*) as current_streak
+FROM streaks
+WHERE streak_group = 0
+"""
+
+LEGACY_LONGEST_STREAK = LEGACY_STREAK_CTE + """
+SELECT streak_group, COUNT(*) as streak_length
+FROM streaks
+GROUP BY streak_group
+ORDER BY streak_length DESC
+LIMIT 1
+"""
+
+LEGACY_WEEKDAY_COUNTS = """
+SELECT
+    strftime('%w', date(timestamp)) as weekday,
+    COUNT(*) as count
+FROM journal_entries
+GROUP BY weekday
+ORDER BY weekday
+"""
+
+LEGACY_VIEW_ENTRIES = """
+SELECT timestamp, entry, mood, tags FROM journal_entries WHERE 1=1 AND mood = ? ORDER BY timestamp DESC
+"""
+
+LEGACY_SEARCH = """
+SELECT timestamp, entry, mood
+FROM journal_entries
+WHERE entry LIKE ?
+ORDER BY timestamp DESC
+LIMIT 5
+"""
+
+FILTER_MOOD = "🙂 Okay"
+SEARCH_QUERY = "mock exam"
+# A month of entries, ending at the generator's last day
+FILTER_END = generate.END_DATE.date()
+FILTER_START = FILTER_END - datetime.timedelta(days=30)
+PAGE_SIZE = 25
+
+
+def has_module(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def streaks(pool, state):
+    journal_db.get_streaks(pool)
+
+
+def weekday_histogram(pool, state):
+    journal_db.get_weekday_counts(pool)
+
+
+def dashboard_aggregates(pool, state):
+    journal_db.get_mood_counts(pool, FILTER_START, FILTER_END)
+    journal_db.get_weekday_mood_counts(pool, FILTER_START, FILTER_END)
+    journal_db.get_hourly_mood_counts(pool, FILTER_START, FILTER_END)
+
+
+def view_entries_page(pool, state):
+    journal_db.count_entries(pool, mood=FILTER_MOOD)
+    journal_db.get_entry_page(pool, mood=FILTER_MOOD, page_size=PAGE_SIZE)
+
+
+def search(pool, state):
+    journal_db.search_entries(pool, SEARCH_QUERY)
+
+
+def search_like_fallback(pool, state):
+    fts_enabled, pool.fts_enabled = pool.fts_enabled, False
+    try:
+        journal_db.search_entries(pool, SEARCH_QUERY)
+    finally:
+        pool.fts_enabled = fts_enabled
+
+
+# One journal save through the app's insert path, activity rollup included.
+# Timestamps move forward from the end of the generated data.
+def insert(pool, state):
+    state["inserted"] = state.get("inserted", 0) + 1
+    timestamp = generate.END_DATE + datetime.timedelta(minutes=state["inserted"])
+    journal_db.insert_entry(pool, timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                            f"Benchmark entry {state['inserted']}", FILTER_MOOD, "benchmark")
+
+
+def related_setup(pool, state):
+    import related_entries
+    state["index"] = related_entries.RelatedEntriesIndex()
+    state["index"].sync(pool)
+    state["page_ids"] = [row[0] for row in journal_db.get_entry_page(pool, page_size=PAGE_SIZE)]
+
+
+def related_entries_page(pool, state):
+    state["index"].similar_batch(state["page_ids"], k=3)
+
+
+def legacy_current_streak(pool, state):
+    with pool.connection() as conn:
+        conn.execute(LEGACY_CURRENT_STREAK).fetchone()
+
+
+def legacy_longest_streak(pool, state):
+    with pool.connection() as conn:
+        conn.execute(LEGACY_LONGEST_STREAK).fetchone()
+
+
+def legacy_weekday_histogram(pool, state):
+    with pool.connection() as conn:
+        conn.execute(LEGACY_WEEKDAY_COUNTS).fetchall()
+
+
+# Fetch every matching entry and derive the chart columns in pandas, as the
+# View Entries tab used to on each rerun
+def legacy_view_entries_dataframe(pool, state):
+    import pandas as pd
+    with pool.connection() as conn:
+        entries = conn.execute(LEGACY_VIEW_ENTRIES, (FILTER_MOOD,)).fetchall()
+    df = pd.DataFrame(entries, columns=["timestamp", "entry", "mood", "tags"])
+    df["date"] = pd.to_datetime(df["timestamp"]).dt.date
+    df["count"] = 1
+    df["weekday"] = pd.to_datetime(df["date"]).dt.day_name()
+    df["hour"] = pd.to_datetime(df["timestamp"]).dt.hour
+
+
+def legacy_like_search(pool, state):
+    with pool.connection() as conn:
+        conn.execute(LEGACY_SEARCH, (f"%{SEARCH_QUERY}%",)).fetchall()
+
+
+# (name, run(pool, state), setup(pool, state) or None, required module or None).
+# Workloads that write come last, so the read workloads all see the same data.
+WORKLOADS = (
+    ("streaks", streaks, None, None),
+    ("weekday_histogram", weekday_histogram, None, None),
+    ("dashboard_aggregates", dashboard_aggregates, None, None),
+    ("view_entries_page", view_entries_page, None, None),
+    ("search_fts", search, None, None),
+    ("search_like_fallback", search_like_fallback, None, None),
+    ("related_entries_page", related_entries_page, related_setup, "numpy"),
+    ("legacy_current_streak", legacy_current_streak, None, None),
+    ("legacy_longest_streak", legacy_longest_streak, None, None),
+    ("legacy_weekday_histogram", legacy_weekday_histogram, None, None),
+    ("legacy_view_entries_dataframe", legacy_view_entries_dataframe, None, "pandas"),
+    ("legacy_like_search", legacy_like_search, None, None),
+    ("insert", insert, None, None),
+)
@@ -0,0 +1,115 @@
+import logging
+
+# === CHAT CONTEXT MANAGEMENT ===
+# Keeps what is sent to Gemini bounded as a conversation grows. The most recent
+# messages are sent verbatim up to a token budget; older ones are folded into
+# a rolling summary, updated incrementally as more messages fall out of the
+# window. The ChatSession is kept across reruns and only rebuilt when the
+# window moves, instead of being recreated from the full history every turn.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_BUDGET = 8000
+# After folding, the verbatim window is cut back to this share of the budget,
+# so the summary (and session rebuild) happens every few turns, not every turn
+FOLD_TARGET = 0.75
+# Rough tokens-per-character ratio for English text; good enough for budgeting
+# without a count_tokens round trip
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PROMPT = """You are maintaining a running summary of a conversation between a user and an AI assistant.
+
+Current summary:
+{summary}
+
+New messages to fold into the summary:
+{transcript}
+
+Rewrite the summary so it includes the new messages. Keep facts, decisions, plans, the user's goals and \
+preferences, and anything the assistant promised. Be concise - at most 300 words."""
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _transcript(messages):
+    return "\n\n".join(
+        f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}" for m in messages
+    )
+
+
+class ChatContext:
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, summarize=None):
+        self.token_budget = token_budget
+        # summarize(client, prompt) -> text; defaults to a GeminiClient call
+        self._summarize = summarize or (lambda client, prompt: client.generate(prompt, call_type="chat_summary"))
+        self.summary = ""
+        self.summarized = 0  # messages[:summarized] are folded into the summary
+        self._chat = None
+        self._client = None
+        self._synced = 0  # messages[:_synced] are reflected in the chat session
+
+    # A chat session whose history covers `messages` (the conversation before
+    # the prompt about to be sent). Reused as long as nothing has happened
+    # since the last reply that it doesn't know about.
+    def session(self, client, messages):
+        folded = self._fold(client, messages)
+        if folded or self._chat is None or self._client is not client or self._synced != len(messages):
+            self._chat = client.start_chat(history=self._history(messages))
+            self._client = client
+            self._synced = len(messages)
+        return self._chat
+
+    # Call once the reply has been appended to messages
+    def commit(self, messages):
+        self._synced = len(messages)
+
+    def reset(self):
+        self.summary = ""
+        self.summarized = 0
+        self._chat = None
+        self._synced = 0
+
+    def _history(self, messages):
+        history = []
+        if self.summary:
+            history.append({"role": "user", "parts": [f"Summary of our conversation so far:\n{self.summary}"]})
+            history.append({"role": "model", "parts": ["Got it, I'll keep that in mind."]})
+        for m in messages[self.summarized:]:
+            # Gemini calls the assistant role "model"
+            history.append({"role": "user" if m["role"] == "user" else "model", "parts": [m["content"]]})
+        return history
+
+    # Fold the oldest verbatim messages into the summary once the window is
+    # over budget. Returns True if the window moved.
+    def _fold(self, client, messages):
+        if self.summarized > len(messages):
+            self.reset()  # History was cleared or replaced
+        tokens = [estimate_tokens(m["content"]) for m in messages[self.summarized:]]
+        total = sum(tokens) + estimate_tokens(self.summary)
+        if total <= self.token_budget:
+            return False
+
+        cut = self.summarized
+        for count in tokens:
+            if total <= self.token_budget * FOLD_TARGET:
+                break
+            total -= count
+            cut += 1
+        # Keep user/assistant pairs together: Gemini expects history to start
+        # with a user turn
+        while cut < len(messages) and messages[cut]["role"] != "user":
+            cut += 1
+
+        prompt = SUMMARY_PROMPT.format(
+            summary=self.summary or "(none yet)",
+            transcript=_transcript(messages[self.summarized:cut]),
+        )
+        try:
+            self.summary = self._summarize(client, prompt).strip()
+        except Exception as e:
+            # Fall back to simply dropping the oldest turns for this request
+            logger.warning("Could not update the chat summary: %s", e)
+        self.summarized = cut
+        return True
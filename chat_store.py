@@ -0,0 +1,136 @@
+import datetime
+import json
+import uuid
+
+import tracing
+
+# === CHAT STORE ===
+# Chat sessions and their messages, kept in the journal database as they
+# happen: each message is a single INSERT, so nothing is lost when the browser
+# session ends and a long chat costs no more to save than a short one. Past
+# sessions can be listed and resumed, and exported to markdown a batch of
+# messages at a time.
+
+TITLE_CHARS = 60
+
+CREATE_CHAT_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS chat_sessions (
+        id TEXT PRIMARY KEY,
+        title TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        message_count INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chat_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL REFERENCES chat_sessions (id),
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        timings TEXT,
+        created_at TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages (session_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions (updated_at)",
+)
+
+INSERT_SESSION = "INSERT INTO chat_sessions (id, created_at, updated_at) VALUES (?, ?, ?)"
+
+INSERT_MESSAGE = """
+INSERT INTO chat_messages (session_id, role, content, timings, created_at) VALUES (?, ?, ?, ?, ?)
+"""
+
+# The first user message names the session
+UPDATE_SESSION = """
+UPDATE chat_sessions SET
+    updated_at = ?,
+    message_count = message_count + 1,
+    title = COALESCE(title, CASE WHEN ? = 'user' THEN ? END)
+WHERE id = ?
+"""
+
+RECENT_SESSIONS = """
+SELECT id, title, updated_at, message_count FROM chat_sessions
+WHERE message_count > 0
+ORDER BY updated_at DESC
+LIMIT ?
+"""
+
+SELECT_SESSION = "SELECT title, created_at FROM chat_sessions WHERE id = ?"
+
+SESSION_MESSAGES = "SELECT role, content, timings FROM chat_messages WHERE session_id = ? ORDER BY id"
+
+
+def _now():
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Applied as a journal_db migration, so the chat tables are versioned with
+# the rest of the schema
+def create_chat_tables(conn):
+    for statement in CREATE_CHAT_TABLES:
+        conn.execute(statement)
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+# The write_* functions run inside the caller's transaction; the app queues
+# them on its WriteQueue
+def write_session(conn, session_id):
+    now = _now()
+    conn.execute(INSERT_SESSION, (session_id, now, now))
+
+
+def write_message(conn, session_id, role, content, timings=None):
+    now = _now()
+    title = " ".join(content.split())[:TITLE_CHARS]
+    conn.execute(INSERT_MESSAGE, (session_id, role, content,
+                                  json.dumps(timings) if timings else None, now))
+    conn.execute(UPDATE_SESSION, (now, role, title, session_id))
+
+
+# Returns [(id, title, updated_at, message_count), ...] most recent first
+@tracing.traced("db")
+def get_recent_sessions(pool, limit=20):
+    with pool.connection() as conn:
+        return conn.execute(RECENT_SESSIONS, (limit,)).fetchall()
+
+
+# Yields the messages of a session as the dicts kept in st.session_state.messages
+@tracing.traced("db")
+def iter_messages(pool, session_id, batch_size=200):
+    with pool.connection() as conn:
+        cursor = conn.execute(SESSION_MESSAGES, (session_id,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for role, content, timings in rows:
+                message = {"role": role, "content": content}
+                if timings:
+                    message["timings"] = json.loads(timings)
+                yield message
+
+
+@tracing.traced("db")
+def load_messages(pool, session_id):
+    return list(iter_messages(pool, session_id))
+
+
+# Yields the session as markdown, one piece per message, for writing straight
+# to a file or response without building the whole transcript in memory
+@tracing.traced("db")
+def iter_markdown(pool, session_id):
+    with pool.connection() as conn:
+        row = conn.execute(SELECT_SESSION, (session_id,)).fetchone()
+    if not row:
+        return
+    yield f"# Chat Session - {row[1]}\n\n"
+    for message in iter_messages(pool, session_id):
+        role = "User" if message["role"] == "user" else "Gemini"
+        yield f"## {role}\n{message['content']}\n\n"
@@ -0,0 +1,56 @@
+import time
+
+# === STREAMED RESPONSE RENDERING ===
+# Re-rendering the placeholder on every chunk re-sends the whole growing
+# response each time. StreamRenderer collects chunks and redraws at most
+# max_fps times a second, with one final draw when the stream ends.
+
+DEFAULT_MAX_FPS = 10
+CURSOR = "▌"
+
+
+class StreamRenderer:
+    def __init__(self, placeholder, max_fps=DEFAULT_MAX_FPS):
+        self.placeholder = placeholder
+        self.min_interval = 1.0 / max_fps
+        self._chunks = []
+        self._last_render = 0.0
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+
+    # Call right before sending the request, so timings include the round trip
+    def start(self):
+        self.started = time.perf_counter()
+
+    def add(self, text_chunk):
+        if not text_chunk:
+            return
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self._chunks.append(text_chunk)
+        if now - self._last_render >= self.min_interval:
+            self._render(self.text + CURSOR)
+            self._last_render = now
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+        self._render(self.text)
+        return self.text
+
+    def _render(self, text):
+        self.placeholder.markdown(text)
+
+    @property
+    def text(self):
+        # Join lazily and keep the result, so repeated reads stay linear
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    # Seconds to first token and total stream time (None until known)
+    def timings(self):
+        end = self.finished_at or time.perf_counter()
+        first = self.first_token_at - self.started if self.first_token_at is not None else None
+        return {"time_to_first_token": first, "total_time": end - self.started}
@@ -0,0 +1,325 @@
+import bisect
+import collections
+import contextlib
+import logging
+import random
+import threading
+import time
+
+import tracing
+
+# === GEMINI CLIENT ===
+# Every model call in the app goes through one GeminiClient per process (the
+# app creates it through st.cache_resource), which adds what the SDK doesn't:
+#   - a token-bucket rate limit and a concurrency cap shared by all sessions
+#   - retries with jittered exponential backoff on 429 and 5xx responses
+#   - a deadline per call, covering queueing, retries and the request itself
+#   - call counters and latency histograms per call type
+# The wrapped model only needs generate_content() and start_chat(), so the
+# client can be exercised against FakeModel below without network access.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_BURST = 10
+DEFAULT_MAX_CONCURRENT = 4
+DEFAULT_TIMEOUT = 120.0
+DEFAULT_MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+class GeminiError(Exception):
+    pass
+
+
+class GeminiTimeout(GeminiError):
+    pass
+
+
+class GeminiUnavailable(GeminiError):
+    pass
+
+
+# google.api_core exceptions carry the HTTP status in .code; anything network-
+# shaped is worth another try as well
+def is_retryable(error):
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS:
+        return True
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity, sleep=time.sleep, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._sleep = sleep
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    # Take one token, waiting until `deadline` (a clock() value) at
+    # most. Returns the seconds spent waiting, or None if the deadline came first.
+    def acquire(self, deadline):
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return None
+            self._sleep(wait)
+            waited += wait
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    # Upper bound of the bucket holding the q-th quantile
+    def quantile(self, q):
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class CallStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttled = 0
+        self.latency = Histogram()
+        self.first_chunk = Histogram()
+
+
+class GeminiClient:
+    def __init__(self, model, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=DEFAULT_BURST,
+                 max_concurrent=DEFAULT_MAX_CONCURRENT, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, sleep=time.sleep):
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(requests_per_minute / 60.0, burst, sleep)
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._stats = collections.defaultdict(CallStats)
+        self._stats_lock = threading.Lock()
+        self._sleep = sleep
+
+    @property
+    def model_name(self):
+        return self.model.model_name
+
+    # Starting a chat is local - the history is only sent with the next message
+    def start_chat(self, history):
+        return self.model.start_chat(history=history)
+
+    def generate(self, prompt, call_type="generate", timeout=None):
+        return self._call(call_type, timeout,
+                          lambda remaining: self.model.generate_content(prompt, request_options={"timeout": remaining})).text
+
+    def send_message(self, chat, prompt, call_type="chat", timeout=None):
+        return self._call(call_type, timeout,
+                          lambda remaining: chat.send_message(prompt, request_options={"timeout": remaining})).text
+
+    # Yields the text of each streamed chunk. Failures before the first chunk
+    # are retried like any other call; once text has been yielded, an error is
+    # raised to the caller instead, since the partial answer is already shown.
+    def stream_message(self, chat, prompt, call_type="chat_stream", timeout=None):
+        deadline = time.monotonic() + (timeout or self.timeout)
+        stats = self._stats_for(call_type)
+        start = time.monotonic()
+        with self._slot(call_type, deadline):
+            for attempt in range(self.max_retries + 1):
+                yielded = False
+                try:
+                    self._throttle(call_type, deadline)
+                    remaining = max(deadline - time.monotonic(), 1.0)
+                    for chunk in chat.send_message(prompt, stream=True, request_options={"timeout": remaining}):
+                        text = getattr(chunk, "text", None)
+                        if not text:
+                            continue
+                        if not yielded:
+                            first_chunk = time.monotonic() - start
+                            self._observe(stats.first_chunk, first_chunk)
+                            tracing.record(f"gemini.{call_type}.first_chunk", "ttft", first_chunk)
+                            yielded = True
+                        yield text
+                    self._record(call_type, time.monotonic() - start)
+                    return
+                except Exception as e:
+                    if yielded or not self._should_retry(call_type, e, attempt, deadline):
+                        self._record(call_type, time.monotonic() - start, error=True)
+                        raise self._wrap(e)
+                    # A failed streaming call leaves the chat's history as it
+                    # was, so the same chat can simply be asked again
+        raise GeminiUnavailable("Gemini is unavailable right now, please try again shortly.")
+
+    def _call(self, call_type, timeout, request):
+        deadline = time.monotonic() + (timeout or self.timeout)
+        start = time.monotonic()
+        with self._slot(call_type, deadline):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self._throttle(call_type, deadline)
+                    response = request(max(deadline - time.monotonic(), 1.0))
+                except Exception as e:
+                    if not self._should_retry(call_type, e, attempt, deadline):
+                        self._record(call_type, time.monotonic() - start, error=True)
+                        raise self._wrap(e)
+                    continue
+                self._record(call_type, time.monotonic() - start)
+                return response
+        raise GeminiUnavailable("Gemini is unavailable right now, please try again shortly.")
+
+    # Concurrency cap, giving up at the deadline
+    @contextlib.contextmanager
+    def _slot(self, call_type, deadline):
+        if not self._slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            self._record(call_type, 0.0, error=True)
+            raise GeminiTimeout("Too many Gemini requests in progress, please try again.")
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def _throttle(self, call_type, deadline):
+        waited = self._bucket.acquire(deadline)
+        if waited is None:
+            raise GeminiTimeout("Gemini rate limit reached, please try again in a moment.")
+        if waited:
+            with self._stats_lock:
+                self._stats[call_type].throttled += 1
+
+    # Back off before the next attempt, or return False if we shouldn't retry
+    def _should_retry(self, call_type, error, attempt, deadline):
+        if attempt >= self.max_retries or not is_retryable(error):
+            return False
+        # Full jitter: a random wait up to the exponential bound
+        delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+        if time.monotonic() + delay > deadline:
+            return False
+        logger.warning("Gemini %s call failed (%s), retrying in %.1fs", call_type, error, delay)
+        with self._stats_lock:
+            self._stats[call_type].retries += 1
+        self._sleep(delay)
+        return True
+
+    def _wrap(self, error):
+        if isinstance(error, GeminiError):
+            return error
+        if getattr(error, "code", None) == 429:
+            return GeminiUnavailable("Gemini's rate limit was hit, please try again in a minute.")
+        if is_retryable(error):
+            return GeminiUnavailable(f"Gemini is unavailable right now, please try again shortly. ({error})")
+        return GeminiError(str(error))
+
+    def _stats_for(self, call_type):
+        with self._stats_lock:
+            return self._stats[call_type]
+
+    def _observe(self, histogram, value):
+        with self._stats_lock:
+            histogram.observe(value)
+
+    def _record(self, call_type, elapsed, error=False):
+        tracing.record(f"gemini.{call_type}", "model", elapsed, error=error)
+        with self._stats_lock:
+            stats = self._stats[call_type]
+            stats.calls += 1
+            if error:
+                stats.errors += 1
+            else:
+                stats.latency.observe(elapsed)
+
+    # Returns {call_type: {...}} with counters and latency quantiles in seconds
+    def metrics(self):
+        with self._stats_lock:
+            return {
+                call_type: {
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "retries": s.retries,
+                    "throttled": s.throttled,
+                    "mean_latency": s.latency.total / s.latency.count if s.latency.count else None,
+                    "p50_latency": s.latency.quantile(0.5),
+                    "p95_latency": s.latency.quantile(0.95),
+                    "p50_first_chunk": s.first_chunk.quantile(0.5),
+                }
+                for call_type, s in self._stats.items()
+            }
+
+
+# === FAKE BACKEND ===
+# Stand-in for genai.GenerativeModel that answers locally. `failures` is a
+# list of exceptions raised by the next calls before they start succeeding.
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def __iter__(self):
+        for word in self.text.split(" "):
+            yield FakeResponse(word + " ")
+
+
+class FakeChat:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history)
+
+    def send_message(self, prompt, stream=False, request_options=None):
+        response = self.model.generate_content(prompt, request_options=request_options)
+        self.history.append({"role": "user", "parts": [prompt]})
+        self.history.append({"role": "model", "parts": [response.text]})
+        return response
+
+
+class FakeModel:
+    def __init__(self, reply="This is a fake reply.", latency=0.0, failures=None,
+                 model_name="models/fake"):
+        self.reply = reply
+        self.latency = latency
+        self.failures = list(failures or [])
+        self.model_name = model_name
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, request_options=None):
+        with self._lock:
+            self.prompts.append(prompt)
+            failure = self.failures.pop(0) if self.failures else None
+        if self.latency:
+            time.sleep(self.latency)
+        if failure:
+            raise failure
+        return FakeResponse(self.reply(prompt) if callable(self.reply) else self.reply)
+
+    def start_chat(self, history=None):
+        return FakeChat(self, history or [])
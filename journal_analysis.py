@@ -0,0 +1,197 @@
+import collections
+import concurrent.futures
+import datetime
+import hashlib
+
+import journal_db
+
+# === MAP-REDUCE JOURNAL ANALYSIS ===
+# "Analyze My Entries" covers the whole journal instead of the first 10,000
+# characters. Entries are grouped into weekly chunks (split further if a week
+# is very long), each chunk is summarized by Gemini (the map step, run
+# concurrently), and the weekly summaries are combined into the final
+# analysis (the reduce step). Summaries are stored by the content hash of
+# their chunk, so after adding an entry only that week is summarized again.
+# Entries are read from the pool; summaries are saved through the app's
+# WriteQueue like every other write.
+
+# Upper bound on the entry text sent in one map request
+CHUNK_MAX_CHARS = 12000
+# Upper bound on the summaries combined in one reduce request; beyond this,
+# summaries are merged in rounds until they fit
+REDUCE_MAX_CHARS = 40000
+MAX_WORKERS = 4
+
+MAP_PROMPT = """Summarize these journal entries from {period}.
+
+Cover the main themes and events, the moods recorded and how they shifted, and any goals, \
+habits or struggles mentioned. Keep it under 150 words.
+
+{entries}"""
+
+MERGE_PROMPT = """Combine these consecutive journal summaries into one summary of the whole period, \
+keeping the main themes, mood changes and notable events in order. Keep it under 300 words.
+
+{summaries}"""
+
+REDUCE_PROMPT = """Analyze this journal and provide insights. Below are summaries of each period \
+of the journal, oldest first.
+
+{summaries}
+
+Please provide:
+1. Key themes and patterns
+2. Emotional trends based on moods: {moods}
+3. Suggestions for improvement or areas to focus on
+4. Any notable changes over time
+
+Format as a clear, bullet-point summary."""
+
+Chunk = collections.namedtuple("Chunk", "period text chunk_hash")
+
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+# Wrap generate so queued requests stop going out once cancel_event is set
+def _cancellable(generate, cancel_event):
+    if cancel_event is None:
+        return generate
+
+    def wrapper(prompt):
+        if cancel_event.is_set():
+            raise AnalysisCancelled()
+        return generate(prompt)
+    return wrapper
+
+
+def _hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _format_entry(timestamp, entry, mood, tags):
+    header = f"[{timestamp}] Mood: {mood}"
+    if tags:
+        header += f" | Tags: {tags}"
+    return f"{header}\n{entry}"
+
+
+def _week_of(timestamp):
+    year, week, _ = datetime.date.fromisoformat(timestamp[:10]).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+# Group entries (oldest first) into weekly chunks of at most max_chars.
+# Returns ([Chunk, ...], set of moods seen).
+def build_chunks(rows, max_chars=CHUNK_MAX_CHARS):
+    chunks = []
+    moods = set()
+    period, parts, size, part_no = None, [], 0, 1
+
+    def flush():
+        if parts:
+            label = period if part_no == 1 else f"{period} (part {part_no})"
+            text = "\n\n".join(parts)
+            chunks.append(Chunk(label, text, _hash(text)))
+
+    for timestamp, entry, mood, tags in rows:
+        moods.add(mood)
+        text = _format_entry(timestamp, entry, mood, tags)[:max_chars]
+        week = _week_of(timestamp)
+        if week != period:
+            flush()
+            period, parts, size, part_no = week, [], 0, 1
+        elif size + len(text) > max_chars:
+            flush()
+            parts, size, part_no = [], 0, part_no + 1
+        parts.append(text)
+        size += len(text)
+    flush()
+    return chunks, moods
+
+
+# Summarize every chunk that has no stored summary, concurrently, and return
+# the summaries in chunk order. on_progress(done, total) is called as
+# summaries finish.
+def summarize_chunks(pool, writer, chunks, generate, max_workers=MAX_WORKERS, on_progress=None,
+                     cancel_event=None):
+    generate = _cancellable(generate, cancel_event)
+    stored = journal_db.get_analysis_summaries(pool, (c.chunk_hash for c in chunks))
+    missing = [c for c in chunks if c.chunk_hash not in stored]
+    if on_progress:
+        on_progress(0, len(missing))
+
+    if missing:
+        saves = []
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            futures = {
+                executor.submit(generate, MAP_PROMPT.format(period=c.period, entries=c.text)): c
+                for c in missing
+            }
+            for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                chunk = futures[future]
+                summary = future.result().strip()
+                stored[chunk.chunk_hash] = summary
+                # Save as we go, so an interrupted run keeps what it finished
+                saves.append(writer.submit(journal_db.write_analysis_summaries,
+                                           [(chunk.chunk_hash, chunk.period, summary)]))
+                if on_progress:
+                    on_progress(done, len(missing))
+        finally:
+            # On error or cancellation, drop the requests that haven't started
+            executor.shutdown(cancel_futures=True)
+        for save in saves:
+            save.result()
+
+    return [(c.period, stored[c.chunk_hash]) for c in chunks], len(missing)
+
+
+# Merge neighbouring summaries in rounds until they fit in one reduce request
+def _merge_summaries(summaries, generate, max_chars, max_workers):
+    while sum(len(s) for s in summaries) > max_chars and len(summaries) > 1:
+        groups, group, size = [], [], 0
+        for summary in summaries:
+            if group and size + len(summary) > max_chars // 2:
+                groups.append(group)
+                group, size = [], 0
+            group.append(summary)
+            size += len(summary)
+        groups.append(group)
+        if len(groups) == len(summaries):
+            # Every summary is too big to pair up; merge them two at a time
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            summaries = list(executor.map(
+                lambda g: generate(MERGE_PROMPT.format(summaries="\n\n".join(g))).strip(), groups))
+    return summaries
+
+
+# Run the full analysis. Returns (analysis text, stats) or (None, stats) if
+# the journal is empty. The final analysis is stored too, keyed on the hashes
+# of all its chunks, so re-running with no new entries is free.
+# Setting cancel_event stops it before the next Gemini request, raising
+# AnalysisCancelled.
+def analyze_journal(pool, writer, generate, max_workers=MAX_WORKERS, on_progress=None, cancel_event=None):
+    chunks, moods = build_chunks(journal_db.iter_entries_for_analysis(pool))
+    stats = {"chunks": len(chunks), "summarized": 0}
+    if not chunks:
+        return None, stats
+
+    analysis_hash = _hash("analysis\0" + "\0".join(c.chunk_hash for c in chunks))
+    stored = journal_db.get_analysis_summaries(pool, [analysis_hash])
+    if analysis_hash in stored:
+        return stored[analysis_hash], stats
+
+    summaries, stats["summarized"] = summarize_chunks(pool, writer, chunks, generate, max_workers,
+                                                      on_progress, cancel_event)
+    generate = _cancellable(generate, cancel_event)
+    labelled = [f"## {period}\n{summary}" for period, summary in summaries]
+    merged = _merge_summaries(labelled, generate, REDUCE_MAX_CHARS, max_workers)
+    analysis = generate(REDUCE_PROMPT.format(
+        summaries="\n\n".join(merged),
+        moods=", ".join(sorted(moods)),
+    )).strip()
+    writer.write(journal_db.write_analysis_summaries, [(analysis_hash, "all", analysis)])
+    return analysis, stats
@@ -0,0 +1,765 @@
+import contextlib
+import datetime
+import hashlib
+import queue
+import re
+import sqlite3
+import threading
+
+import chat_store
+import tracing
+
+# === DATA ACCESS LAYER ===
+# All tabs go through this module instead of opening their own sqlite3
+# connections. The app keeps one ConnectionPool per process (see get_db in
+# personal_assisstant.py), so a rerun just borrows an already-open connection.
+
+# Pragmas applied once to every pooled connection.
+# WAL lets the dashboard keep reading while a journal save is writing, and
+# busy_timeout makes overlapping writers wait instead of failing with
+# "database is locked".
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA mmap_size = 67108864",
+    "PRAGMA foreign_keys = ON",
+)
+
+# sqlite3 keeps a per-connection cache of compiled statements keyed by the SQL
+# text. The queries below are module-level constants, so every rerun hits the
+# cache and reuses the prepared statement.
+STATEMENT_CACHE_SIZE = 256
+
+DEFAULT_POOL_SIZE = 4
+
+ONE_DAY = datetime.timedelta(days=1)
+
+# Characters of entry text shown before an entry is opened in View Entries
+ENTRY_PREVIEW_CHARS = 120
+
+
+class ConnectionPool:
+    def __init__(self, db_path, size=DEFAULT_POOL_SIZE, timeout=30.0):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.fts_enabled = False
+
+    def _connect(self):
+        # isolation_level=None keeps reads in autocommit mode so they never hold
+        # a transaction open; writes use transaction() below.
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        # Pool exhausted - wait for another session to hand a connection back
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError(f"No database connection available after {self.timeout:g}s "
+                               f"(all {self.size} in use)") from None
+
+    def _release(self, conn):
+        if self._closed:
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put_nowait(conn)
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two sessions saving
+        # at once queue on busy_timeout instead of deadlocking on lock upgrade.
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# === QUERIES ===
+CREATE_JOURNAL_TABLE = """
+CREATE TABLE IF NOT EXISTS journal_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    mood TEXT NOT NULL,
+    tags TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    reflection TEXT,
+    content_hash TEXT
+)
+"""
+
+# Columns added after the table was first created, with their types
+ADDED_JOURNAL_COLUMNS = (
+    ("reflection", "TEXT"),
+    ("content_hash", "TEXT"),
+)
+
+# Identical entries (same timestamp, text, mood and tags) are stored once, so
+# importing the same files twice is harmless
+CREATE_CONTENT_HASH_INDEX = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_journal_content_hash ON journal_entries (content_hash)"
+)
+
+INSERT_ENTRY = """
+INSERT OR IGNORE INTO journal_entries (timestamp, entry, mood, tags, reflection, content_hash)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# === DATA VERSION ===
+# Bumped by triggers on every change to journal_entries, from any connection or
+# process. Cached dashboard data is keyed on it.
+CREATE_DATA_VERSION = (
+    """
+    CREATE TABLE IF NOT EXISTS data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    """,
+    "INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)",
+    """
+    CREATE TRIGGER IF NOT EXISTS data_version_ai AFTER INSERT ON journal_entries BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS data_version_au AFTER UPDATE ON journal_entries BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS data_version_ad AFTER DELETE ON journal_entries BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END
+    """,
+)
+
+SELECT_DATA_VERSION = "SELECT version FROM data_version WHERE id = 1"
+
+# === DAILY ACTIVITY ROLLUP ===
+# One row per day with its entry count, plus the current/longest streak kept
+# in a single-row table. Both are updated in the same transaction as each
+# insert, so the Habit Tracking expander reads them instead of scanning
+# journal_entries on every rerun.
+CREATE_ACTIVITY_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS daily_activity (
+        day TEXT PRIMARY KEY,
+        entry_count INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS streak_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_day TEXT,
+        current_streak INTEGER NOT NULL DEFAULT 0,
+        longest_streak INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+)
+
+UPSERT_DAILY_ACTIVITY = """
+INSERT INTO daily_activity (day, entry_count) VALUES (?, 1)
+ON CONFLICT(day) DO UPDATE SET entry_count = entry_count + 1
+"""
+
+SELECT_STREAK_STATS = "SELECT last_day, current_streak, longest_streak FROM streak_stats WHERE id = 1"
+
+SAVE_STREAK_STATS = """
+INSERT INTO streak_stats (id, last_day, current_streak, longest_streak) VALUES (1, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    last_day = excluded.last_day,
+    current_streak = excluded.current_streak,
+    longest_streak = excluded.longest_streak
+"""
+
+WEEKDAY_COUNTS = """
+SELECT
+    strftime('%w', day) as weekday,
+    SUM(entry_count) as count
+FROM daily_activity
+GROUP BY weekday
+ORDER BY weekday
+"""
+
+# === ANALYSIS SUMMARIES ===
+# Gemini summaries from "Analyze My Entries", keyed by the content hash of the
+# chunk of entries they summarize. Unchanged weeks are never summarized twice.
+CREATE_ANALYSIS_TABLE = """
+CREATE TABLE IF NOT EXISTS analysis_summaries (
+    chunk_hash TEXT PRIMARY KEY,
+    period TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID
+"""
+
+ENTRIES_FOR_ANALYSIS = "SELECT timestamp, entry, mood, tags FROM journal_entries ORDER BY timestamp, id"
+
+ENTRIES_AFTER_ID = "SELECT id, entry, tags FROM journal_entries WHERE id > ? ORDER BY id"
+
+ALL_TAGS = "SELECT tags FROM journal_entries WHERE tags IS NOT NULL AND tags != ''"
+
+SAVE_ANALYSIS_SUMMARY = """
+INSERT OR REPLACE INTO analysis_summaries (chunk_hash, period, summary) VALUES (?, ?, ?)
+"""
+
+# === FULL-TEXT SEARCH ===
+# External-content FTS5 index over entry text, mood and tags. The triggers keep
+# it in sync with journal_entries, so the text itself is stored only once.
+CREATE_SEARCH_INDEX = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS journal_fts USING fts5(
+        entry, mood, tags,
+        content='journal_entries',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS journal_fts_ai AFTER INSERT ON journal_entries BEGIN
+        INSERT INTO journal_fts (rowid, entry, mood, tags)
+        VALUES (new.id, new.entry, new.mood, new.tags);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS journal_fts_ad AFTER DELETE ON journal_entries BEGIN
+        INSERT INTO journal_fts (journal_fts, rowid, entry, mood, tags)
+        VALUES ('delete', old.id, old.entry, old.mood, old.tags);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS journal_fts_au AFTER UPDATE ON journal_entries BEGIN
+        INSERT INTO journal_fts (journal_fts, rowid, entry, mood, tags)
+        VALUES ('delete', old.id, old.entry, old.mood, old.tags);
+        INSERT INTO journal_fts (rowid, entry, mood, tags)
+        VALUES (new.id, new.entry, new.mood, new.tags);
+    END
+    """,
+)
+
+# bm25 weights follow the column order (entry, mood, tags): a tag or mood hit
+# says more about an entry than one word somewhere in its text.
+SEARCH_ENTRIES = """
+SELECT
+    e.timestamp,
+    snippet(journal_fts, 0, '**', '**', '…', 24) as excerpt,
+    e.mood,
+    e.tags
+FROM journal_fts
+JOIN journal_entries e ON e.id = journal_fts.rowid
+WHERE journal_fts MATCH ?
+ORDER BY bm25(journal_fts, 1.0, 2.0, 2.0)
+LIMIT ?
+"""
+
+SEARCH_ENTRIES_LIKE = """
+SELECT timestamp, entry, mood, tags
+FROM journal_entries
+WHERE entry LIKE ? OR mood LIKE ? OR tags LIKE ?
+ORDER BY timestamp DESC
+LIMIT ?
+"""
+
+SEARCH_TERM = re.compile(r"\w+")
+
+
+# === SCHEMA MIGRATIONS ===
+# The schema version is recorded in schema_version, one row per migration
+# applied. On startup init_db applies whatever is missing, in order, in a
+# single transaction. Migrations 1 and 3 only use IF NOT EXISTS statements, so
+# they also adopt databases whose tables were created before versioning
+# existed.
+# To change the schema, append a migration - never edit an applied one.
+
+CREATE_SCHEMA_VERSION = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# Timestamps are stored as "YYYY-MM-DD HH:MM:SS" text, so day ranges are plain
+# range scans on the timestamp index. (timestamp, id) matches the View
+# Entries keyset ordering; the mood index serves the mood filter the same
+# way; the expression index covers grouping by day in the rollup rebuild.
+CREATE_ENTRY_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_journal_timestamp ON journal_entries (timestamp, id)",
+    "CREATE INDEX IF NOT EXISTS idx_journal_mood ON journal_entries (mood, timestamp, id)",
+    "CREATE INDEX IF NOT EXISTS idx_journal_day ON journal_entries (date(timestamp))",
+)
+
+
+def _initial_schema(conn):
+    conn.execute(CREATE_JOURNAL_TABLE)
+    add_journal_columns(conn)
+    conn.execute(CREATE_CONTENT_HASH_INDEX)
+    for statement in CREATE_DATA_VERSION:
+        conn.execute(statement)
+    conn.execute(CREATE_ANALYSIS_TABLE)
+    init_activity(conn)
+    init_search(conn)
+
+
+def _entry_indexes(conn):
+    for statement in CREATE_ENTRY_INDEXES:
+        conn.execute(statement)
+    conn.execute("ANALYZE journal_entries")
+
+
+# (version, description, apply(conn))
+MIGRATIONS = (
+    (1, "journal, rollup, analysis and search tables", _initial_schema),
+    (2, "indexes on timestamp, mood and entry day", _entry_indexes),
+    (3, "chat sessions and messages", chat_store.create_chat_tables),
+)
+
+
+# Apply any migrations newer than the database. Returns the versions applied.
+def migrate(conn, migrations=MIGRATIONS):
+    conn.execute(CREATE_SCHEMA_VERSION)
+    current = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+    latest = migrations[-1][0] if migrations else 0
+    if current > latest:
+        raise RuntimeError(f"Database schema version {current} is newer than this app supports ({latest})")
+    applied = []
+    for version, description, apply in migrations:
+        if version <= current:
+            continue
+        apply(conn)
+        conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)", (version, description))
+        applied.append(version)
+    return applied
+
+
+# Bring the database up to the current schema, so no tab depends on a journal
+# entry having been saved first
+@tracing.traced("db")
+def init_db(pool):
+    with pool.transaction() as conn:
+        migrate(conn)
+        pool.fts_enabled = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'journal_fts'"
+        ).fetchone() is not None
+
+
+# Bring a journal_entries table from an older version of the app up to the
+# current columns, filling in content hashes for the existing rows. Older
+# versions could save the same entry twice; only the first copy gets the
+# hash, so the unique index can be built. Later copies keep a NULL hash and
+# are left in place rather than deleted.
+def add_journal_columns(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(journal_entries)")}
+    for name, column_type in ADDED_JOURNAL_COLUMNS:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE journal_entries ADD COLUMN {name} {column_type}")
+    if "content_hash" not in existing:
+        seen = set()
+        updates = []
+        for row in conn.execute("SELECT id, timestamp, entry, mood, tags FROM journal_entries ORDER BY id"):
+            content_hash = entry_hash(*row[1:])
+            if content_hash not in seen:
+                seen.add(content_hash)
+                updates.append((content_hash, row[0]))
+        conn.executemany("UPDATE journal_entries SET content_hash = ? WHERE id = ?", updates)
+
+
+# Create the rollup tables and backfill them from journal_entries if they
+# have never been populated (e.g. a database from before the rollup existed)
+def init_activity(conn):
+    for statement in CREATE_ACTIVITY_TABLES:
+        conn.execute(statement)
+    if not conn.execute(SELECT_STREAK_STATS).fetchone():
+        rebuild_activity(conn)
+
+
+# Create the FTS5 index and its sync triggers, indexing any existing entries
+# the first time. Returns False if this SQLite build has no FTS5, in which case
+# search falls back to LIKE.
+def init_search(conn):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'journal_fts'"
+    ).fetchone()
+    try:
+        for statement in CREATE_SEARCH_INDEX:
+            conn.execute(statement)
+    except sqlite3.OperationalError as e:
+        if "fts5" in str(e):
+            return False
+        raise
+    if not exists:
+        conn.execute("INSERT INTO journal_fts (journal_fts) VALUES ('rebuild')")
+    return True
+
+
+# Recompute the rollup from scratch. O(entries) - only used for backfill, bulk
+# imports and entries dated before the latest journaled day.
+def rebuild_activity(conn):
+    conn.execute("DELETE FROM daily_activity")
+    conn.execute("""
+    INSERT INTO daily_activity (day, entry_count)
+    SELECT date(timestamp), COUNT(*) FROM journal_entries GROUP BY date(timestamp)
+    """)
+    last_day, current, longest = None, 0, 0
+    for (day,) in conn.execute("SELECT day FROM daily_activity ORDER BY day"):
+        day = datetime.date.fromisoformat(day)
+        if last_day is not None and day - last_day == ONE_DAY:
+            current += 1
+        else:
+            current = 1
+        longest = max(longest, current)
+        last_day = day
+    conn.execute(SAVE_STREAK_STATS, (last_day.isoformat() if last_day else None, current, longest))
+
+
+# Update the rollup for one new entry on `day`. Must run inside the insert's
+# transaction so the counts can never drift from journal_entries.
+def record_activity(conn, day):
+    conn.execute(UPSERT_DAILY_ACTIVITY, (day.isoformat(),))
+    entry_count = conn.execute(
+        "SELECT entry_count FROM daily_activity WHERE day = ?", (day.isoformat(),)
+    ).fetchone()[0]
+    if entry_count > 1:
+        return  # Already journaled that day, streaks are unchanged
+
+    row = conn.execute(SELECT_STREAK_STATS).fetchone()
+    last_day, current, longest = row if row else (None, 0, 0)
+    last_day = datetime.date.fromisoformat(last_day) if last_day else None
+
+    if last_day is None or day - last_day > ONE_DAY:
+        current = 1
+    elif day - last_day == ONE_DAY:
+        current += 1
+    else:
+        # A back-dated entry can join or bridge older streaks
+        rebuild_activity(conn)
+        return
+    conn.execute(SAVE_STREAK_STATS, (day.isoformat(), current, max(longest, current)))
+
+
+def entry_hash(timestamp, entry, mood, tags):
+    content = "\0".join((timestamp, entry, mood, tags or ""))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# Insert a new journal entry and update the activity rollup, inside the
+# caller's transaction. Returns its id, or None if an identical entry was
+# already stored. This is the write the app queues on its WriteQueue.
+def write_entry(conn, timestamp, entry, mood, tags, reflection=None):
+    cursor = conn.execute(INSERT_ENTRY, (timestamp, entry, mood, tags, reflection,
+                                         entry_hash(timestamp, entry, mood, tags)))
+    if not cursor.rowcount:
+        return None
+    record_activity(conn, datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").date())
+    return cursor.lastrowid
+
+
+# Insert a new journal entry in its own transaction. Returns its id, or None
+# if an identical entry was already stored.
+@tracing.traced("db")
+def insert_entry(pool, timestamp, entry, mood, tags, reflection=None):
+    with pool.transaction() as conn:
+        return write_entry(conn, timestamp, entry, mood, tags, reflection)
+
+
+# Insert many entries in one transaction, skipping any already stored.
+# rows are (timestamp, entry, mood, tags, reflection); returns how many were new.
+# The activity rollup is not touched - call refresh_activity once the whole
+# batch of batches is in.
+@tracing.traced("db")
+def insert_entries(pool, rows):
+    with pool.transaction() as conn:
+        return conn.executemany(INSERT_ENTRY, (
+            (timestamp, entry, mood, tags, reflection, entry_hash(timestamp, entry, mood, tags))
+            for timestamp, entry, mood, tags, reflection in rows
+        )).rowcount
+
+
+@tracing.traced("db")
+def refresh_activity(pool):
+    with pool.transaction() as conn:
+        rebuild_activity(conn)
+
+
+# Returns (current_streak, longest_streak) in days. The current streak only
+# counts if the last journaled day is today or yesterday.
+@tracing.traced("db")
+def get_streaks(pool, today=None):
+    today = today or datetime.date.today()
+    with pool.connection() as conn:
+        row = conn.execute(SELECT_STREAK_STATS).fetchone()
+    if not row or not row[0]:
+        return 0, 0
+    last_day, current, longest = row
+    if today - datetime.date.fromisoformat(last_day) > ONE_DAY:
+        current = 0
+    return current, longest
+
+
+@tracing.traced("db")
+def get_data_version(pool):
+    with pool.connection() as conn:
+        return conn.execute(SELECT_DATA_VERSION).fetchone()[0]
+
+
+# Returns [(weekday "0"-"6" with 0 = Sunday, count), ...]
+@tracing.traced("db")
+def get_weekday_counts(pool):
+    with pool.connection() as conn:
+        return conn.execute(WEEKDAY_COUNTS).fetchall()
+
+
+# Build the WHERE clause shared by the View Entries queries, for entries from
+# `start` to `end` (dates, both inclusive) with the given mood. The day range
+# is a bound on the raw timestamp rather than date(timestamp), so it can use
+# the timestamp and mood indexes.
+def _entry_filters(start=None, end=None, mood=None):
+    query = " WHERE 1=1"
+    params = []
+    if start:
+        query += " AND timestamp >= ?"
+        params.append(start.strftime("%Y-%m-%d"))
+    if end:
+        query += " AND timestamp < ?"
+        params.append((end + ONE_DAY).strftime("%Y-%m-%d"))
+    if mood:
+        query += " AND mood = ?"
+        params.append(mood)
+    return query, params
+
+
+# === DASHBOARD AGGREGATES ===
+# Counts only - the mood charts never need to read entry text.
+
+# Returns [(mood, count), ...] most common first
+@tracing.traced("db")
+def get_mood_counts(pool, start=None, end=None, mood=None):
+    where, params = _entry_filters(start, end, mood)
+    query = "SELECT mood, COUNT(*) FROM journal_entries" + where + " GROUP BY mood ORDER BY COUNT(*) DESC"
+    with pool.connection() as conn:
+        return conn.execute(query, params).fetchall()
+
+
+# Returns [(weekday "0"-"6" with 0 = Sunday, mood, count), ...]
+@tracing.traced("db")
+def get_weekday_mood_counts(pool, start=None, end=None, mood=None):
+    where, params = _entry_filters(start, end, mood)
+    query = ("SELECT strftime('%w', timestamp) as weekday, mood, COUNT(*) FROM journal_entries" + where
+             + " GROUP BY weekday, mood ORDER BY weekday")
+    with pool.connection() as conn:
+        return conn.execute(query, params).fetchall()
+
+
+# Returns [(hour 0-23, mood, count), ...]
+@tracing.traced("db")
+def get_hourly_mood_counts(pool, start=None, end=None, mood=None):
+    where, params = _entry_filters(start, end, mood)
+    query = ("SELECT CAST(strftime('%H', timestamp) AS INTEGER) as hour, mood, COUNT(*) FROM journal_entries"
+             + where + " GROUP BY hour, mood ORDER BY hour")
+    with pool.connection() as conn:
+        return conn.execute(query, params).fetchall()
+
+
+@tracing.traced("db")
+def count_entries(pool, start=None, end=None, mood=None):
+    with pool.connection() as conn:
+        if not start and not end and not mood:
+            # Unfiltered total straight from the per-day rollup
+            return conn.execute("SELECT COALESCE(SUM(entry_count), 0) FROM daily_activity").fetchone()[0]
+        where, params = _entry_filters(start, end, mood)
+        return conn.execute("SELECT COUNT(*) FROM journal_entries" + where, params).fetchone()[0]
+
+
+# One page of entries, newest first, without the full entry text.
+# `after` is the (timestamp, id) of the last row of the previous page; seeking
+# past it keeps every page as cheap as the first, unlike OFFSET.
+# Returns [(id, timestamp, mood, tags, preview), ...]
+@tracing.traced("db")
+def get_entry_page(pool, start=None, end=None, mood=None, page_size=10, after=None,
+                   preview_chars=ENTRY_PREVIEW_CHARS):
+    where, params = _entry_filters(start, end, mood)
+    query = "SELECT id, timestamp, mood, tags, substr(entry, 1, ?) FROM journal_entries" + where
+    params = [preview_chars] + params
+    if after:
+        query += " AND (timestamp, id) < (?, ?)"
+        params.extend(after)
+    query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    params.append(page_size)
+    with pool.connection() as conn:
+        return conn.execute(query, params).fetchall()
+
+
+@tracing.traced("db")
+def get_entry_text(pool, entry_id):
+    with pool.connection() as conn:
+        row = conn.execute("SELECT entry FROM journal_entries WHERE id = ?", (entry_id,)).fetchone()
+        return row[0] if row else None
+
+
+@tracing.traced("db")
+def get_entry_reflection(pool, entry_id):
+    with pool.connection() as conn:
+        row = conn.execute("SELECT reflection FROM journal_entries WHERE id = ?", (entry_id,)).fetchone()
+        return row[0] if row else None
+
+
+# Returns {id: (timestamp, mood, preview)} for the given entry ids
+@tracing.traced("db")
+def get_entry_previews(pool, entry_ids, preview_chars=ENTRY_PREVIEW_CHARS, batch_size=500):
+    entry_ids = list(entry_ids)
+    previews = {}
+    with pool.connection() as conn:
+        for i in range(0, len(entry_ids), batch_size):
+            batch = entry_ids[i:i + batch_size]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT id, timestamp, mood, substr(entry, 1, ?) FROM journal_entries WHERE id IN ({placeholders})",
+                [preview_chars] + batch,
+            )
+            previews.update((row[0], row[1:]) for row in rows)
+    return previews
+
+
+# Yields (id, entry, tags) for entries with an id above after_id, a batch at a time
+@tracing.traced("db")
+def iter_entries_after(pool, after_id, batch_size=500):
+    with pool.connection() as conn:
+        cursor = conn.execute(ENTRIES_AFTER_ID, (after_id,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+
+# Yields (id, timestamp, mood, tags, entry, reflection) oldest first, a batch
+# at a time, filtered as in _entry_filters
+@tracing.traced("db")
+def iter_entries(pool, start=None, end=None, mood=None, batch_size=500):
+    where, params = _entry_filters(start, end, mood)
+    query = "SELECT id, timestamp, mood, tags, entry, reflection FROM journal_entries" + where
+    query += " ORDER BY timestamp, id"
+    with pool.connection() as conn:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+
+# Yields (timestamp, entry, mood, tags) oldest first, a batch at a time
+@tracing.traced("db")
+def iter_entries_for_analysis(pool, batch_size=500):
+    with pool.connection() as conn:
+        cursor = conn.execute(ENTRIES_FOR_ANALYSIS)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+
+# Returns the tags column of every tagged entry
+@tracing.traced("db")
+def get_all_tags(pool):
+    with pool.connection() as conn:
+        return [row[0] for row in conn.execute(ALL_TAGS)]
+
+
+# Returns {chunk_hash: summary} for the hashes that have been summarized
+@tracing.traced("db")
+def get_analysis_summaries(pool, chunk_hashes, batch_size=500):
+    found = {}
+    chunk_hashes = list(chunk_hashes)
+    with pool.connection() as conn:
+        for start in range(0, len(chunk_hashes), batch_size):
+            batch = chunk_hashes[start:start + batch_size]
+            placeholders = ",".join("?" * len(batch))
+            found.update(conn.execute(
+                f"SELECT chunk_hash, summary FROM analysis_summaries WHERE chunk_hash IN ({placeholders})",
+                batch,
+            ).fetchall())
+    return found
+
+
+# rows are (chunk_hash, period, summary). Runs inside the caller's
+# transaction; journal_analysis queues it on the app's WriteQueue.
+def write_analysis_summaries(conn, rows):
+    conn.executemany(SAVE_ANALYSIS_SUMMARY, rows)
+
+
+# Turn free text into an FTS5 query: every word must match, as a prefix, in
+# the entry text, mood or tags. Quoting each term keeps FTS5 operators and
+# punctuation in user input from being parsed as query syntax.
+def build_match_query(search_query):
+    terms = SEARCH_TERM.findall(search_query)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+# Returns [(timestamp, excerpt, mood, tags), ...] best match first. The excerpt
+# is a snippet with matches in **bold**.
+@tracing.traced("db")
+def search_entries(pool, search_query, limit=5):
+    with pool.connection() as conn:
+        if not pool.fts_enabled:
+            pattern = f"%{search_query}%"
+            return conn.execute(SEARCH_ENTRIES_LIKE, (pattern, pattern, pattern, limit)).fetchall()
+        match_query = build_match_query(search_query)
+        if not match_query:
+            return []
+        return conn.execute(SEARCH_ENTRIES, (match_query, limit)).fetchall()
@@ -0,0 +1,137 @@
+import argparse
+import csv
+import datetime
+import io
+import itertools
+import json
+import os
+import sys
+import zlib
+
+import journal_db
+
+# === JOURNAL EXPORT ===
+# Writes journal entries out as JSON Lines, CSV or markdown. Rows are read
+# with one cursor in fixed-size batches and each batch is serialized (and
+# optionally gzipped) before the next is fetched, so memory use doesn't grow
+# with the size of the journal. The markdown format is the one the app used
+# to save journal/*.md files in, so journal_import.py can read it back.
+#
+#   python journal_export.py entries.jsonl.gz --from 2025-01-01 --mood "😄 Great"
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), "journal_entries.db")
+DEFAULT_BATCH_SIZE = 500
+
+FORMATS = ("jsonl", "csv", "md")
+MIME_TYPES = {"jsonl": "application/x-ndjson", "csv": "text/csv", "md": "text/markdown"}
+CSV_COLUMNS = ("id", "timestamp", "mood", "tags", "entry", "reflection")
+
+
+def _jsonl(rows, header):
+    return "".join(json.dumps(dict(zip(CSV_COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows)
+
+
+def _csv(rows, header):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def _markdown(rows, header):
+    parts = []
+    for _, timestamp, mood, tags, entry, reflection in rows:
+        parts.append(f"# Journal Entry - {timestamp}\n\n## Mood\n{mood}\n\n## Tags\n{tags or ''}\n\n"
+                     f"## Your Entry\n{entry}\n\n")
+        if reflection:
+            parts.append(f"## Gemini Reflection\n{reflection}\n\n")
+    return "".join(parts)
+
+
+SERIALIZERS = {"jsonl": _jsonl, "csv": _csv, "md": _markdown}
+
+
+# Yields the export as text, one batch of entries per chunk
+def iter_export(pool, fmt, start=None, end=None, mood=None, batch_size=DEFAULT_BATCH_SIZE):
+    serialize = SERIALIZERS[fmt]
+    rows = journal_db.iter_entries(pool, start, end, mood, batch_size)
+    header = True
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            if header and fmt == "csv":
+                yield serialize([], header)  # An empty CSV still gets its header row
+            return
+        yield serialize(batch, header)
+        header = False
+
+
+# Encodes text chunks as UTF-8, gzip-compressing them on the fly if asked
+def iter_bytes(chunks, compress=False):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits=31: gzip container
+    for chunk in chunks:
+        data = chunk.encode("utf-8")
+        if compressor:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor:
+        yield compressor.flush()
+
+
+def export_filename(fmt, compress=False, now=None):
+    now = now or datetime.datetime.now()
+    return f"journal_{now.strftime('%Y-%m-%d_%H-%M-%S')}.{fmt}" + (".gz" if compress else "")
+
+
+# Write the export to a binary file object
+def write_export(pool, f, fmt, start=None, end=None, mood=None, compress=False,
+                 batch_size=DEFAULT_BATCH_SIZE):
+    for data in iter_bytes(iter_export(pool, fmt, start, end, mood, batch_size), compress):
+        f.write(data)
+
+
+def _date(value):
+    return datetime.date.fromisoformat(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export journal entries as JSON Lines, CSV or markdown.")
+    parser.add_argument("output", help="output file, or - for stdout; the format and gzip are taken "
+                                       "from the extension unless given (e.g. entries.csv.gz)")
+    parser.add_argument("--format", choices=FORMATS, help="output format")
+    parser.add_argument("--gzip", action="store_true", help="gzip-compress the output")
+    parser.add_argument("--from", dest="start", type=_date, help="first day to include (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", type=_date, help="last day to include (YYYY-MM-DD)")
+    parser.add_argument("--mood", help="only entries with this mood, e.g. \"😄 Great\"")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="database file (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="entries fetched and written at a time (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    name = args.output.lower()
+    compress = args.gzip or name.endswith(".gz")
+    fmt = args.format
+    if not fmt:
+        extension = name[:-3] if name.endswith(".gz") else name
+        fmt = next((f for f in FORMATS if extension.endswith("." + f)), None)
+        if not fmt:
+            parser.error("can't tell the format from the file name, pass --format")
+
+    pool = journal_db.ConnectionPool(args.db, size=1)
+    try:
+        journal_db.init_db(pool)
+        if args.output == "-":
+            write_export(pool, sys.stdout.buffer, fmt, args.start, args.end, args.mood, compress,
+                         args.batch_size)
+        else:
+            with open(args.output, "wb") as f:
+                write_export(pool, f, fmt, args.start, args.end, args.mood, compress, args.batch_size)
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import datetime
+import logging
+import os
+import time
+
+import journal_db
+
+# === LEGACY JOURNAL IMPORT ===
+# Older versions of the app saved each entry as a markdown file in journal/:
+#
+#   # Journal Entry - 2025-04-10 14:51:42
+#   ## Mood
+#   ## Tags
+#   ## Your Entry
+#   ## Gemini Reflection
+#
+# This imports them into journal_entries so they show up in streaks, the
+# dashboard and search. Files are read line by line and inserted a batch at a
+# time with executemany; entries already in the database (by content hash)
+# are skipped, so running it again is safe.
+#
+#   python journal_import.py [journal_dir] [--db journal_entries.db]
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.dirname(__file__), "journal")
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), "journal_entries.db")
+DEFAULT_BATCH_SIZE = 500
+
+ENTRY_HEADER = "# Journal Entry - "
+SECTIONS = {
+    "## Mood": "mood",
+    "## Tags": "tags",
+    "## Your Entry": "entry",
+    "## Gemini Reflection": "reflection",
+}
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+UNKNOWN_MOOD = "Unknown"
+
+
+# Yields (timestamp, entry, mood, tags, reflection) for each entry in the
+# lines of one file. Headings other than the known sections are treated as
+# part of the text, since entries and reflections often contain markdown.
+# Entries without a valid timestamp or any entry text are skipped.
+def parse_entries(lines, source="<input>"):
+    timestamp, sections, current = None, {}, None
+
+    def finish():
+        entry = "\n".join(sections.get("entry", [])).strip()
+        if timestamp is None:
+            return None
+        if not entry:
+            logger.warning("%s: entry from %s has no text, skipping", source, timestamp)
+            return None
+        mood = "\n".join(sections.get("mood", [])).strip() or UNKNOWN_MOOD
+        tags = "\n".join(sections.get("tags", [])).strip()
+        reflection = "\n".join(sections.get("reflection", [])).strip()
+        return timestamp, entry, mood, tags, reflection or None
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line.startswith(ENTRY_HEADER):
+            record = finish()
+            if record:
+                yield record
+            sections, current = {}, None
+            try:
+                timestamp = datetime.datetime.strptime(
+                    line[len(ENTRY_HEADER):].strip(), TIMESTAMP_FORMAT).strftime(TIMESTAMP_FORMAT)
+            except ValueError:
+                logger.warning("%s: bad entry header %r, skipping entry", source, line)
+                timestamp = None
+        elif line.strip() in SECTIONS:
+            current = SECTIONS[line.strip()]
+        elif current:
+            sections.setdefault(current, []).append(line)
+    record = finish()
+    if record:
+        yield record
+
+
+# Yields the entries of every .md file in the directory, in file name order
+def iter_directory(directory):
+    names = sorted(entry.name for entry in os.scandir(directory)
+                   if entry.is_file() and entry.name.endswith(".md"))
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            with open(path, encoding="utf-8-sig", errors="replace") as f:
+                yield from parse_entries(f, source=path)
+        except OSError as e:
+            logger.warning("Could not read %s: %s", path, e)
+
+
+# Import every entry under `directory`. on_progress(stats) is called after
+# each batch. Returns stats: parsed, inserted, duplicates, seconds, rows_per_sec.
+def import_directory(pool, directory, batch_size=DEFAULT_BATCH_SIZE, on_progress=None):
+    stats = {"parsed": 0, "inserted": 0, "duplicates": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+    start = time.perf_counter()
+
+    def flush(batch):
+        inserted = journal_db.insert_entries(pool, batch)
+        stats["parsed"] += len(batch)
+        stats["inserted"] += inserted
+        stats["duplicates"] += len(batch) - inserted
+        stats["seconds"] = time.perf_counter() - start
+        stats["rows_per_sec"] = stats["parsed"] / stats["seconds"] if stats["seconds"] else 0.0
+        if on_progress:
+            on_progress(stats)
+
+    batch = []
+    for record in iter_directory(directory):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    # Streaks and the weekday chart come from the rollup; rebuild it once for
+    # the whole import, even if nothing was new, to repair an interrupted run
+    journal_db.refresh_activity(pool)
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import legacy markdown journal entries into the database.")
+    parser.add_argument("directory", nargs="?", default=DEFAULT_JOURNAL_DIR,
+                        help="directory of journal_*.md files (default: %(default)s)")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="database file (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="entries per transaction (default: %(default)s)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+
+    pool = journal_db.ConnectionPool(args.db, size=1)
+    try:
+        journal_db.init_db(pool)
+        stats = import_directory(
+            pool, args.directory, args.batch_size,
+            on_progress=lambda s: print(f"\r{s['parsed']:,} parsed, {s['inserted']:,} new "
+                                        f"({s['rows_per_sec']:,.0f} rows/s)", end="", flush=True),
+        )
+    finally:
+        pool.close()
+    print(f"\nImported {stats['inserted']:,} of {stats['parsed']:,} entries "
+          f"({stats['duplicates']:,} already present) in {stats['seconds']:.2f}s - "
+          f"{stats['rows_per_sec']:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+
+# === LAZY IMPORTS ===
+# The voice and charting stacks take most of the app's cold start, and many
+# sessions never use them. Call sites import them through timed_import when
+# they actually need them, and every first import is timed so cold start can
+# be tracked from the report below.
+
+logger = logging.getLogger(__name__)
+
+# module name -> seconds spent on its first import in this process
+IMPORT_TIMES = {}
+_lock = threading.Lock()
+
+
+def timed_import(module_name):
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    with _lock:
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        elapsed = time.perf_counter() - start
+        IMPORT_TIMES[module_name] = elapsed
+        logger.info("Imported %s in %.1f ms", module_name, elapsed * 1000)
+        return module
+
+
+# Returns [(module name, milliseconds), ...] slowest first
+def import_report():
+    return sorted(((name, elapsed * 1000) for name, elapsed in IMPORT_TIMES.items()),
+                  key=lambda item: item[1], reverse=True)
@@ -1,29 +1,103 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import datetime
+import io
 import os
-import google.generativeai as genai
-import requests
-import time
-from ics import Calendar, Event
-import speech_recognition as sr
-import pyttsx3
-from gtts import gTTS
-import tempfile
+import atexit
+import base64
+import concurrent.futures
+import json
 import threading
-import queue
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import time
+import uuid
+import audio_cache
+import chat_context
+import chat_store
+import chat_stream
+import gemini_client
+import journal_analysis
+import journal_db
+import journal_export
+import related_entries
+import response_cache
+import stt_service
+import tracing
+import tts_service
+import write_queue
+from lazy_imports import timed_import, import_report
+
+# Gemini is needed on every page; timed_import just records it in the import report.
+# Voice (speech_recognition, pyttsx3, gtts) and charting (plotly) libraries are
+# imported on first use instead - see below.
+genai = timed_import("google.generativeai")
 
 # === USER CONFIG ===
 GEMINI_API_KEY = st.secrets["GEMINI_API_KEY"]  # Store this in .streamlit/secrets.toml
 CAPACITIES_SPACE_ID = "b50fd297-0053-4975-bd95-805920f11d1d"
 JOURNAL_OBJECT_TYPE_ID = "e0d4f9f7-87f1-4cef-98d1-fcb1308b8458"
+AUDIO_CACHE_DIR = os.path.join(os.path.dirname(__file__), "audio_cache")
+AUDIO_CACHE_MAX_MB = 200  # Synthesized speech kept on disk for replays
+RESPONSE_CACHE_PATH = os.path.join(os.path.dirname(__file__), "response_cache.db")
+RESPONSE_CACHE_TTL_DAYS = 7  # Saved answers to repeat prompts expire after this
+RESPONSE_CACHE_MAX_ENTRIES = 500
+GEMINI_REQUESTS_PER_MINUTE = 60  # Shared by all sessions
+GEMINI_MAX_CONCURRENT = 4
+GEMINI_TIMEOUT = 120  # Seconds per call, including queueing and retries
+POLL_SECONDS = 0.2  # How often a running analysis checks for Cancel
+CHAT_TOKEN_BUDGET = 8000  # Approximate tokens of recent chat sent verbatim with each message
+TRACE_ENABLED = os.environ.get("NYSH_TRACE") == "1"  # Per-rerun timing panel in the sidebar, plus a span log
+TRACE_LOG_PATH = os.path.join(os.path.dirname(__file__), "logs", "trace.jsonl")
+
+# Spans for this script run are collected from here until the timing panel
+# at the bottom of the page. Fragment reruns of a single tab don't reach the
+# panel; their spans only go to the log.
+tracing.configure(TRACE_ENABLED, TRACE_LOG_PATH)
+tracing.start_run()
 
 # === INIT GEMINI ===
 genai.configure(api_key=GEMINI_API_KEY)
 model = genai.GenerativeModel("gemini-2.5-pro-preview-03-25")
 
+# All model calls go through one client per process, so the rate limit,
+# concurrency cap and call metrics are shared by every session
+@st.cache_resource
+def get_gemini():
+    return gemini_client.GeminiClient(model,
+                                      requests_per_minute=GEMINI_REQUESTS_PER_MINUTE,
+                                      max_concurrent=GEMINI_MAX_CONCURRENT,
+                                      timeout=GEMINI_TIMEOUT)
+
+# === INIT DATABASE ===
+DB_PATH = os.path.join(os.path.dirname(__file__), "journal_entries.db")
+
+# One connection pool per process, shared by every session and rerun
+@st.cache_resource
+def get_db():
+    pool = journal_db.ConnectionPool(DB_PATH)
+    journal_db.init_db(pool)
+    return pool
+
+# Every app write to the database goes through this one writer thread, which
+# commits whatever the sessions have queued in one transaction. Anything still
+# queued is committed when the process exits.
+@st.cache_resource
+def get_writer():
+    writer = write_queue.WriteQueue(get_db())
+    atexit.register(writer.close)
+    return writer
+
+RELATED_INDEX_PATH = os.path.join(os.path.dirname(__file__), "journal_index.npz")
+RELATED_ENTRIES_SHOWN = 3
+
+# TF-IDF index behind the "Related entries" panels, loaded from disk and
+# topped up with any entries saved since. Saved again when the process exits.
+@st.cache_resource
+def get_related_index():
+    index = related_entries.RelatedEntriesIndex.load(RELATED_INDEX_PATH)
+    index.sync(get_db())
+    atexit.register(index.save)
+    return index
+
 st.set_page_config(page_title="Nysh GPT", page_icon="📱", layout="centered", initial_sidebar_state="collapsed")
 
 # Add app title with custom styling
@@ -133,81 +207,104 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # === VOICE FUNCTIONALITY ===
-# Initialize speech recognition
-recognizer = sr.Recognizer()
-
-# Initialize text-to-speech engines
-def init_pyttsx3():
-    engine = pyttsx3.init()
-    return engine
-
-# Queue for handling TTS in background
-tts_queue = queue.Queue()
-tts_active = threading.Event()
-tts_active.set()
-
-# Initialize TTS engine in a separate thread to avoid UI blocking
-tts_engine = None
-def initialize_tts_engine():
-    global tts_engine
-    tts_engine = init_pyttsx3()
-
-# Start TTS engine initialization in background
-tts_thread = threading.Thread(target=initialize_tts_engine)
-tts_thread.daemon = True
-tts_thread.start()
-
-# Function to process TTS queue
-def tts_worker():
-    while tts_active.is_set():
-        try:
-            text = tts_queue.get(timeout=0.5)
-            if text:
-                # Use gTTS for better quality voice
-                with tempfile.NamedTemporaryFile(delete=True, suffix='.mp3') as fp:
-                    tts = gTTS(text=text, lang='en')
-                    tts.save(fp.name)
-                    st.audio(fp.name, format='audio/mp3')
-            tts_queue.task_done()
-        except queue.Empty:
-            pass
-        except Exception as e:
-            st.error(f"TTS Error: {e}")
-
-# Start TTS worker thread
-tts_worker_thread = threading.Thread(target=tts_worker)
-tts_worker_thread.daemon = True
-tts_worker_thread.start()
-
-# Function to capture voice input
-def voice_to_text():
-    with sr.Microphone() as source:
-        st.session_state.voice_status = "Listening..."
-        recognizer.adjust_for_ambient_noise(source, duration=0.5)
-        try:
-            audio = recognizer.listen(source, timeout=5, phrase_time_limit=10)
-            st.session_state.voice_status = "Processing..."
-            text = recognizer.recognize_google(audio)
-            st.session_state.voice_status = "Done"
-            return text
-        except sr.WaitTimeoutError:
-            st.session_state.voice_status = "No speech detected"
-            return ""
-        except sr.UnknownValueError:
-            st.session_state.voice_status = "Could not understand audio"
-            return ""
-        except sr.RequestError as e:
-            st.session_state.voice_status = f"Error: {e}"
-            return ""
-        except Exception as e:
-            st.session_state.voice_status = f"Error: {e}"
-            return ""
+# The speech libraries are only imported once voice is actually used
+
+# Background microphone capture and transcription for the whole process,
+# shared by every session. It calibrates for background noise on the first
+# recording and reuses that threshold afterwards.
+@st.cache_resource
+def get_stt():
+    service = stt_service.SpeechCaptureService()
+    atexit.register(service.close)
+    return service
+
+# Saved Gemini replies for repeat prompts, shared by every session
+@st.cache_resource
+def get_response_cache():
+    return response_cache.ResponseCache(RESPONSE_CACHE_PATH,
+                                        ttl=RESPONSE_CACHE_TTL_DAYS * 24 * 3600,
+                                        max_entries=RESPONSE_CACHE_MAX_ENTRIES)
+
+# One text-to-speech worker for the whole process, shared by every session
+@st.cache_resource
+def get_tts():
+    cache = audio_cache.AudioCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_MB * 1024 * 1024)
+    service = tts_service.TTSService(cache=cache)
+    atexit.register(service.close)
+    return service
+
+# Stable id for this browser session, used to route finished audio back to it
+def get_session_id():
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
 
 # Function to speak text
 def text_to_speech(text):
     if not text:
         return
-    tts_queue.put(text)
+    try:
+        get_tts().submit(get_session_id(), text)
+    except tts_service.TTSQueueFull as e:
+        st.warning(str(e))
+
+# Browser-side playlist for synthesized clips. The queue and its Audio object
+# live on the parent Streamlit window, so clips keep playing one after another
+# in order even though this iframe is replaced on every render.
+AUDIO_QUEUE_HTML = """
+<script>
+const player = window.parent.__nyshAudio || (window.parent.__nyshAudio = {
+    queue: [], seen: new Set(), audio: new window.parent.Audio(), playing: false,
+});
+const playNext = () => {
+    const clip = player.queue.shift();
+    player.playing = Boolean(clip);
+    if (clip) {
+        player.audio.src = clip;
+        player.audio.play().catch(playNext);
+    }
+};
+player.audio.onended = playNext;
+for (const [id, clip] of %s) {
+    if (!player.seen.has(id)) {
+        player.seen.add(id);
+        player.queue.push(clip);
+    }
+}
+if (!player.playing) playNext();
+</script>
+"""
+
+# Hand finished clips to the browser playlist; returns False if there were none
+def play_tts_results(results):
+    clips = []
+    for result in results:
+        if result.error:
+            st.error(f"TTS Error: {result.error}")
+        else:
+            encoded = base64.b64encode(result.audio).decode("ascii")
+            clips.append([result.clip_id, f"data:{result.format};base64,{encoded}"])
+    if clips:
+        components.html(AUDIO_QUEUE_HTML % json.dumps(clips), height=0)
+    return bool(clips)
+
+# Plays speech synthesized for this session. While clips are still pending
+# the fragment polls once a second; otherwise it only runs with the tab it is
+# rendered in. Each tab that can speak renders one, so speech asked for in a
+# tab's fragment rerun starts playing without a full page run.
+@tracing.traced("ui", "tts.player")
+def render_tts_player():
+    if "session_id" not in st.session_state:
+        return  # Nothing has been spoken in this session yet
+    tts = get_tts()
+    session_id = get_session_id()
+    
+    def player():
+        play_tts_results(tts.collect(session_id))
+        if tts.pending(session_id):
+            st.caption("🔊 Preparing audio...")
+    
+    st.fragment(player, run_every=1.0 if tts.pending(session_id) else None)()
 
 # Initialize voice status in session state
 if "voice_status" not in st.session_state:
@@ -236,90 +333,100 @@ def voice_input_button(key, target_input_key=None, callback=None):
     with col2:
         st.markdown(f'<div class="voice-status" id="{key}-status">Click to record</div>', unsafe_allow_html=True)
     
-    if st.button("🎤 Record", key=f"voice_btn_{key}"):
-        text = voice_to_text()
-        if text and target_input_key:
-            st.session_state[target_input_key] = text
-        if callback and text:
-            callback(text)
-        return text
-    return None
+    # Recording and recognition run on the speech service's threads, so the
+    # page stays usable meanwhile. Transcripts come back to this button only.
+    stt = get_stt()
+    owner = f"{get_session_id()}:{key}"
+    if st.button("🎤 Record", key=f"voice_btn_{key}", disabled=bool(stt.pending(owner))):
+        try:
+            stt.submit(owner)
+        except stt_service.CaptureQueueFull as e:
+            st.warning(str(e))
+    
+    # While a recording is pending this polls twice a second for its status.
+    # Once it has finished the whole page reruns, so the tab can use the text
+    # and the polling stops.
+    def status():
+        st.session_state.voice_status = stt.status(owner) or "Ready"
+        st.caption(f"🎙️ {st.session_state.voice_status}")
+        transcripts = stt.collect(owner)
+        for transcript in transcripts:
+            if transcript.text:
+                st.session_state[f"voice_text_{key}"] = transcript.text
+                if target_input_key:
+                    st.session_state[target_input_key] = transcript.text
+                if callback:
+                    callback(transcript.text)
+        if transcripts and not stt.pending(owner):
+            st.rerun()
+    
+    st.fragment(status, run_every=0.5 if stt.pending(owner) else None)()
+    return st.session_state.pop(f"voice_text_{key}", None)
 
 # Voice output button component
 def voice_output_button(text, key):
     if st.button("🔊 Listen", key=f"voice_out_{key}"):
         text_to_speech(text)
 
+# Search chat messages newest first, stopping after `limit` hits. Lowercased
+# copies are kept in session state and only extended for new messages, so a
+# search doesn't re-lowercase the whole conversation on every rerun.
+def search_messages(messages, query, limit=5):
+    lowered = st.session_state.setdefault("messages_lower", [])
+    lowered.extend(m["content"].lower() for m in messages[len(lowered):])
+    
+    query = query.lower()
+    results = []
+    for i in range(len(messages) - 1, -1, -1):
+        if query in lowered[i]:
+            results.append(messages[i])
+            if len(results) >= limit:
+                break
+    return results
+
+WEEKDAY_NAMES = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+# Mood chart aggregates for the View Entries tab. data_version is part of the
+# cache key, so the cached counts are reused until a new entry is saved.
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_mood_dashboard(data_version, start, end, mood):
+    db = get_db()
+    return {
+        "moods": journal_db.get_mood_counts(db, start, end, mood),
+        "weekly": journal_db.get_weekday_mood_counts(db, start, end, mood),
+        "hourly": journal_db.get_hourly_mood_counts(db, start, end, mood),
+    }
+
+# Streaks and weekday counts for Habit Tracking, cached the same way. The
+# current streak depends on today's date, so that is part of the key too.
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_habit_stats(data_version, today):
+    db = get_db()
+    return journal_db.get_streaks(db, today), journal_db.get_weekday_counts(db)
+
 # === APP TABS ===
+# Each tab is a fragment: a widget in one tab only reruns that tab, so
+# sending a chat message doesn't redraw the dashboard or re-query the
+# journal. A full page run still renders all three. A saved entry or a
+# finished voice recording reruns the whole page with st.rerun(); everything
+# else reruns just its own fragment.
 tab1, tab2, tab3 = st.tabs(["📓 Journal", "📂 View Entries", "💬 Chat"])
 
 # === JOURNAL TAB ===
-with tab1:
+@st.fragment
+@tracing.traced("ui", "tab.journal")
+def journal_tab():
     st.title("🧠 Reflective Journal")
     st.markdown("##### Your personal space for reflection and growth")
     
     # Habit tracking section
-    with st.expander("🔥 Habit Tracking", expanded=True):
+    with st.expander("🔥 Habit Tracking", expanded=True), tracing.span("journal.habit_tracking", "ui"):
         st.markdown("##### Your Journaling Streaks")
         
         try:
-            import sqlite3
-            db_path = os.path.join(os.path.dirname(__file__), "journal_entries.db")
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            # Get current streak
-            cursor.execute("""
-            WITH dates AS (
-                SELECT date(timestamp) as entry_date
-                FROM journal_entries
-                ORDER BY timestamp DESC
-            ),
-            grouped AS (
-                SELECT 
-                    entry_date,
-                    julianday(entry_date) - julianday(LAG(entry_date) OVER (ORDER BY entry_date DESC)) as day_diff
-                FROM dates
-            ),
-            streaks AS (
-                SELECT 
-                    entry_date,
-                    SUM(CASE WHEN day_diff = 1 THEN 0 ELSE 1 END) OVER (ORDER BY entry_date DESC) as streak_group
-                FROM grouped
-            )
-            SELECT COUNT(*) as current_streak
-            FROM streaks
-            WHERE streak_group = 0
-            """)
-            current_streak = cursor.fetchone()[0] or 0
-            
-            # Get longest streak
-            cursor.execute("""
-            WITH dates AS (
-                SELECT date(timestamp) as entry_date
-                FROM journal_entries
-                ORDER BY timestamp DESC
-            ),
-            grouped AS (
-                SELECT 
-                    entry_date,
-                    julianday(entry_date) - julianday(LAG(entry_date) OVER (ORDER BY entry_date DESC)) as day_diff
-                FROM dates
-            ),
-            streaks AS (
-                SELECT 
-                    entry_date,
-                    SUM(CASE WHEN day_diff = 1 THEN 0 ELSE 1 END) OVER (ORDER BY entry_date DESC) as streak_group
-                FROM grouped
-            )
-            SELECT streak_group, COUNT(*) as streak_length
-            FROM streaks
-            GROUP BY streak_group
-            ORDER BY streak_length DESC
-            LIMIT 1
-            """)
-            longest_streak = cursor.fetchone()
-            longest_streak_length = longest_streak[1] if longest_streak else 0
+            # Current and longest streak from the daily_activity rollup
+            (current_streak, longest_streak_length), weekly_counts = load_habit_stats(
+                journal_db.get_data_version(get_db()), datetime.date.today())
             
             # Display streak info
             col1, col2 = st.columns(2)
@@ -331,37 +438,24 @@ with tab1:
                          help="Your longest journaling streak")
             
             # Weekly consistency
-            cursor.execute("""
-            SELECT 
-                strftime('%w', date(timestamp)) as weekday,
-                COUNT(*) as count
-            FROM journal_entries
-            GROUP BY weekday
-            ORDER BY weekday
-            """)
-            weekly_counts = cursor.fetchall()
-            
             if weekly_counts:
-                days = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
                 counts = [0]*7
                 for day_num, count in weekly_counts:
                     counts[int(day_num)] = count
                 
-                fig = px.bar(x=days, y=counts, 
+                px = timed_import("plotly.express")
+                fig = px.bar(x=WEEKDAY_NAMES, y=counts, 
                             labels={"x": "Day of Week", "y": "Entries"},
                             title="Weekly Journaling Consistency")
                 st.plotly_chart(fig, use_container_width=True)
             
         except Exception as e:
             st.error(f"Error loading habit data: {e}")
-        finally:
-            if 'conn' in locals():
-                conn.close()
        # Create a card-like container for the form
     with st.container():
         st.markdown("---")
         # === JOURNAL FORM ===
-        with st.form("journal_form"):
+        with st.form("journal_form"), tracing.span("journal.form", "ui"):
             st.subheader("New Entry")
             
             # Add voice input for journal entry
@@ -405,39 +499,23 @@ with tab1:
             
             if submitted:
                 try:
-                    import sqlite3
-                    # Initialize database connection
-                    db_path = os.path.join(os.path.dirname(__file__), "journal_entries.db")
-                    conn = sqlite3.connect(db_path)
-                    cursor = conn.cursor()
-                    
-                    # Create table if it doesn't exist
-                    cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS journal_entries (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        timestamp TEXT NOT NULL,
-                        entry TEXT NOT NULL,
-                        mood TEXT NOT NULL,
-                        tags TEXT,
-                        created_at TEXT DEFAULT CURRENT_TIMESTAMP
-                    )
-                    """)
-                    
                     # Insert new entry
                     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    cursor.execute(
-                        "INSERT INTO journal_entries (timestamp, entry, mood, tags) VALUES (?, ?, ?, ?)",
-                        (timestamp, entry, mood, tags)
-                    )
-                    conn.commit()
+                    # Queued with any other sessions' saves; returns once committed
+                    entry_id = get_writer().write(journal_db.write_entry, timestamp, entry, mood, tags)
+                    if entry_id:
+                        get_related_index().add(entry_id, related_entries.entry_text(entry, tags))
                     
-                    st.success("Journal entry saved to database!")
                     st.session_state.journal_entry = ""  # Clear the entry
+                    # The streaks and the View Entries tab should show the new
+                    # entry, so rerun the whole page rather than this tab
+                    st.session_state.journal_saved = True
+                    st.rerun()
                 except Exception as e:
                     st.error(f"Error saving journal entry: {e}")
-                finally:
-                    if 'conn' in locals():
-                        conn.close()
+            
+            if st.session_state.pop("journal_saved", False):
+                st.success("Journal entry saved to database!")
         
         # Voice recording outside the form
         if st.session_state.get("show_voice_journal", False):
@@ -447,186 +525,295 @@ with tab1:
             def update_journal_entry(text):
                 st.session_state.journal_entry = text
                 st.session_state.journal_text_area = text
-                st.rerun()
             
             voice_text = voice_input_button("journal_voice", callback=update_journal_entry)
             if voice_text:
                 st.success(f"Recorded: {voice_text}")
                 st.session_state.journal_entry = voice_text
+    
+    # Speech asked for in this tab, played without rerunning the page
+    render_tts_player()
 
 # === VIEW ENTRIES TAB ===
-with tab2:
+@st.fragment
+@tracing.traced("ui", "tab.view_entries")
+def view_entries_tab():
     st.title("📊 Dashboard & Journal Entries")
     st.markdown("Visualize your mood trends and browse past entries")
       
     try:
-        import sqlite3
-        import plotly.express as px
-        import pandas as pd
-        import plotly.express as px
-        import plotly.graph_objects as go
-        from plotly.subplots import make_subplots
-        db_path = os.path.join(os.path.dirname(__file__), "journal_entries.db")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
         # Add filters
+        mood_options = ["All", "😄 Great", "🙂 Okay", "😐 Neutral", "😔 Low", "😣 Anxious"]
         col1, col2 = st.columns([1, 1])
         with col1:
-            date_filter = st.date_input("Filter by date")
+            # A range picker; while only the first day is picked, that day alone
+            date_range = st.date_input("Filter by date range", value=(), key="date_range")
         with col2:
-            mood_filter = st.selectbox("Filter by mood", 
-                                     ["All", "😄 Great", "🙂 Okay", "😐 Neutral", "😔 Low", "😣 Anxious"])
+            mood_filter = st.selectbox("Filter by mood", mood_options)
         
-        # Build query
-        query = "SELECT timestamp, entry, mood, tags FROM journal_entries WHERE 1=1"
-        params = []
-
-        if date_filter:
-            query += " AND date(timestamp) = date(?)"
-            params.append(date_filter.strftime('%Y-%m-%d'))
-        if mood_filter != "All":
-            query += " AND mood = ?"
-            params.append(mood_filter)
-        
-        query += " ORDER BY timestamp DESC"
+        filters = {
+            "start": date_range[0] if date_range else None,
+            "end": date_range[-1] if date_range else None,
+            "mood": mood_filter if mood_filter != "All" else None,
+        }
         
-        # Execute query
-        cursor.execute(query, params)
-        entries = cursor.fetchall()
+        # Chart data is aggregated in SQL and cached until the next insert
+        dashboard = load_mood_dashboard(journal_db.get_data_version(get_db()), **filters)
         
-        if entries:
-            # Prepare data for visualizations
-            df = pd.DataFrame(entries, columns=["timestamp", "entry", "mood", "tags"])
-            df["date"] = pd.to_datetime(df["timestamp"]).dt.date
-            df["count"] = 1
-            df["weekday"] = pd.to_datetime(df["date"]).dt.day_name()
-            df["hour"] = pd.to_datetime(df["timestamp"]).dt.hour
+        with tracing.span("view_entries.charts", "ui"):
+            if dashboard["moods"]:
+                px = timed_import("plotly.express")
+                mood_colors = {
+                    "😄 Great": "#4CAF50",
+                    "🙂 Okay": "#8BC34A",
+                    "😐 Neutral": "#FFC107",
+                    "😔 Low": "#FF9800",
+                    "😣 Anxious": "#F44336"
+                }
             
-            # Mood distribution pie chart
-            with st.expander("📈 Mood Distribution", expanded=True):
-                mood_counts = df["mood"].value_counts().reset_index()
-                mood_counts.columns = ["mood", "count"]
-                
-                fig = px.pie(mood_counts, values="count", names="mood", 
-                            color="mood",
-                            color_discrete_map={
-                                "😄 Great": "#4CAF50",
-                                "🙂 Okay": "#8BC34A",
-                                "😐 Neutral": "#FFC107",
-                                "😔 Low": "#FF9800",
-                                "😣 Anxious": "#F44336"
-                            },
-                            title="Mood Distribution")
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Weekly patterns
-                weekly_patterns = df.groupby(["weekday", "mood"])["count"].sum().unstack().fillna(0)
-                weekly_patterns = weekly_patterns.reindex(["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"])
+                # Mood distribution pie chart
+                with st.expander("📈 Mood Distribution", expanded=True):
+                    moods, counts = zip(*dashboard["moods"])
+                    fig = px.pie(values=counts, names=moods, 
+                                color=moods,
+                                color_discrete_map=mood_colors,
+                                title="Mood Distribution")
+                    st.plotly_chart(fig, use_container_width=True)
                 
-                fig = px.bar(weekly_patterns, 
-                            title="Weekly Mood Patterns",
-                            labels={"value": "Entries", "weekday": "Day of Week"},
-                            color_discrete_map={
-                                "😄 Great": "#4CAF50",
-                                "🙂 Okay": "#8BC34A",
-                                "😐 Neutral": "#FFC107",
-                                "😔 Low": "#FF9800",
-                                "😣 Anxious": "#F44336"
-                            })
-                st.plotly_chart(fig, use_container_width=True)
+                    # Weekly patterns
+                    weekdays, moods, counts = zip(*dashboard["weekly"])
+                    fig = px.bar(x=[WEEKDAY_NAMES[int(day)] for day in weekdays], y=counts, color=moods,
+                                title="Weekly Mood Patterns",
+                                labels={"y": "Entries", "x": "Day of Week", "color": "mood"},
+                                category_orders={"x": WEEKDAY_NAMES[1:] + WEEKDAY_NAMES[:1]},
+                                color_discrete_map=mood_colors)
+                    st.plotly_chart(fig, use_container_width=True)
                 
-                # Time of day patterns
-                hourly_patterns = df.groupby(["hour", "mood"])["count"].sum().unstack().fillna(0)
-                fig = px.bar(hourly_patterns, 
-                            title="Time of Day Patterns",
-                            labels={"value": "Entries", "hour": "Hour of Day"},
-                            color_discrete_map={
-                                "😄 Great": "#4CAF50",
-                                "🙂 Okay": "#8BC34A",
-                                "😐 Neutral": "#FFC107",
-                                "😔 Low": "#FF9800",
-                                "😣 Anxious": "#F44336"
-                            })
-                st.plotly_chart(fig, use_container_width=True)
+                    # Time of day patterns
+                    hours, moods, counts = zip(*dashboard["hourly"])
+                    fig = px.bar(x=hours, y=counts, color=moods,
+                                title="Time of Day Patterns",
+                                labels={"y": "Entries", "x": "Hour of Day", "color": "mood"},
+                                color_discrete_map=mood_colors)
+                    st.plotly_chart(fig, use_container_width=True)
             
-            # Individual entries display
-            with st.expander("📂 View Individual Entries", expanded=True):
-                for entry in entries:
-                    with st.expander(f"{entry[0]} - {entry[2]}"):
-                        st.markdown(f"**Mood:** {entry[2]}")
-                        if entry[3]:
-                            st.markdown(f"**Tags:** {entry[3]}")
-                        st.markdown(f"**Entry:**\n{entry[1]}")
-        else:
-            st.info("No entries found matching your filters.")
+            else:
+                st.info("No entries found matching your filters.")
+        
+        # Individual entries display, one keyset-paginated page at a time.
+        # Paging only reruns the browser, not the charts above it.
+        @st.fragment
+        @tracing.traced("ui", "view_entries.browser")
+        def entries_browser():
+            page_size = st.selectbox("Entries per page", [10, 25, 50], key="entries_page_size")
+            
+            # Start again from the first page whenever the filters change
+            filter_key = (tuple(date_range), mood_filter, page_size)
+            if st.session_state.get("entries_filter_key") != filter_key:
+                st.session_state.entries_filter_key = filter_key
+                st.session_state.entries_page_cursors = [None]
+            cursors = st.session_state.entries_page_cursors
+            
+            total = journal_db.count_entries(get_db(), **filters)
+            page = journal_db.get_entry_page(get_db(), page_size=page_size, after=cursors[-1], **filters)
+            
+            # Related entries for the whole page in one batched lookup
+            related_index = get_related_index()
+            related_index.sync(get_db())
+            related = related_index.similar_batch([row[0] for row in page], k=RELATED_ENTRIES_SHOWN)
+            related_previews = journal_db.get_entry_previews(
+                get_db(), {other_id for matches in related.values() for other_id, _ in matches})
+            
+            for entry_id, timestamp, entry_mood, entry_tags, preview in page:
+                with st.expander(f"{timestamp} - {entry_mood}"):
+                    st.markdown(f"**Mood:** {entry_mood}")
+                    if entry_tags:
+                        st.markdown(f"**Tags:** {entry_tags}")
+                    # Entry text is only fetched once asked for
+                    if st.toggle("Show full entry", key=f"show_entry_{entry_id}"):
+                        st.markdown(f"**Entry:**\n{journal_db.get_entry_text(get_db(), entry_id)}")
+                        reflection = journal_db.get_entry_reflection(get_db(), entry_id)
+                        if reflection:
+                            st.markdown(f"**Gemini Reflection:**\n{reflection}")
+                    else:
+                        st.markdown(f"**Entry:**\n{preview}{'…' if len(preview) == journal_db.ENTRY_PREVIEW_CHARS else ''}")
+                    if related.get(entry_id):
+                        st.markdown("**Related entries:**")
+                        for other_id, score in related[entry_id]:
+                            if other_id in related_previews:
+                                other_timestamp, other_mood, other_preview = related_previews[other_id]
+                                st.caption(f"{other_timestamp} - {other_mood} · {score:.0%} similar  \n{other_preview}{'…' if len(other_preview) == journal_db.ENTRY_PREVIEW_CHARS else ''}")
+            
+            page_count = max(1, -(-total // page_size))
+            prev_col, info_col, next_col = st.columns([1, 2, 1])
+            with prev_col:
+                if st.button("← Newer", disabled=len(cursors) == 1, use_container_width=True):
+                    cursors.pop()
+                    st.rerun(scope="fragment")
+            with info_col:
+                st.markdown(f"Page {len(cursors)} of {page_count} · {total} entries")
+            with next_col:
+                if st.button("Older →", disabled=len(page) < page_size or len(cursors) >= page_count,
+                             use_container_width=True):
+                    cursors.append((page[-1][1], page[-1][0]))
+                    st.rerun(scope="fragment")
+        
+        with st.expander("📂 View Individual Entries", expanded=True):
+            entries_browser()
+        
+        # Export. st.download_button needs the whole file as bytes, so the
+        # download is built in memory; journal_export.py on the command line
+        # streams to disk for journals too big for that. Gzip keeps it small.
+        @st.fragment
+        @tracing.traced("ui", "view_entries.export")
+        def export_entries():
+            export_col1, export_col2 = st.columns([1, 1])
+            with export_col1:
+                export_format = st.selectbox("Format", journal_export.FORMATS,
+                                             format_func={"jsonl": "JSON Lines", "csv": "CSV", "md": "Markdown"}.get)
+                export_range = st.date_input("Date range", value=(), key="export_range")
+            with export_col2:
+                export_mood = st.selectbox("Mood", mood_options, key="export_mood")
+                export_gzip = st.checkbox("Compress (gzip)")
+            
+            if st.button("Prepare export", use_container_width=True):
+                # A half-picked range covers just the one day
+                export_start = export_range[0] if export_range else None
+                export_end = export_range[-1] if export_range else None
+                f = io.BytesIO()
+                journal_export.write_export(get_db(), f, export_format, export_start, export_end,
+                                            export_mood if export_mood != "All" else None, export_gzip)
+                st.download_button(
+                    "⬇️ Download",
+                    data=f.getvalue(),
+                    file_name=journal_export.export_filename(export_format, export_gzip),
+                    mime="application/gzip" if export_gzip else journal_export.MIME_TYPES[export_format],
+                    use_container_width=True,
+                )
+        
+        with st.expander("📤 Export Entries"):
+            export_entries()
         
     except Exception as e:
         st.error(f"Error loading journal entries: {e}")
     finally:
-        if 'conn' in locals():
-            conn.close()
-        
-        # AI Insights section
-        with st.container():
+        # AI Insights section, its own fragment so the Cancel button doesn't
+        # rerun the rest of the tab
+        @st.fragment
+        @tracing.traced("ui", "view_entries.ai_insights")
+        def ai_insights():
             st.markdown("### 🤖 AI-Powered Insights")
             st.markdown("##### Journal Entry Analysis")
             
+            if st.session_state.get("cancel_analysis"):
+                st.info("Analysis cancelled.")
+            
             if st.button("🔍 Analyze My Entries"):
-                with st.spinner("Analyzing your journal entries..."):
-                    try:
-                        import sqlite3
-                        db_path = os.path.join(os.path.dirname(__file__), "journal_entries.db")
-                        conn = sqlite3.connect(db_path)
-                        cursor = conn.cursor()
+                # The themes analysis and the habit suggestions don't depend on
+                # each other, so both run at once and each section is shown as
+                # soon as its result arrives
+                gemini = get_gemini()
+                generate = lambda prompt: gemini.generate(prompt, call_type="analysis")
+                cancel_event = threading.Event()
+                progress_state = {}
+                executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+                futures = {}
+                
+                try:
+                    futures[executor.submit(
+                        journal_analysis.analyze_journal, get_db(), get_writer(), generate,
+                        on_progress=lambda done, total: progress_state.update(done=done, total=total),
+                        cancel_event=cancel_event,
+                    )] = "analysis"
+                    
+                    # Additional analysis for common tags
+                    tags = journal_db.get_all_tags(get_db())
+                    if tags:
+                        prompt = f"""Analyze these journal tags and suggest habits:
                         
-                        # Get all entries
-                        cursor.execute("SELECT entry, mood, tags FROM journal_entries ORDER BY timestamp DESC")
-                        entries = cursor.fetchall()
+                        Tags: {', '.join(tags)}
                         
-                        if entries:
-                            # Prepare data for analysis
-                            all_text = " ".join([entry[0] for entry in entries])
-                            moods = [entry[1] for entry in entries]
-                            tags = [entry[2] for entry in entries if entry[2]]
-                            
-                            # Generate insights with Gemini
-                            prompt = f"""Analyze these journal entries and provide insights:
-                            
-                            Journal Entries: {all_text[:10000]}
-                            
-                            Please provide:
-                            1. Key themes and patterns
-                            2. Emotional trends based on moods: {', '.join(set(moods))}
-                            3. Suggestions for improvement or areas to focus on
-                            4. Any notable changes over time
-                            
-                            Format as a clear, bullet-point summary."""
-                            
-                            response = model.generate_content(prompt)
-                            with st.container():
-                                st.markdown(response.text)
-                            
-                            # Additional analysis for common tags
-                            if tags:
-                                prompt = f"""Analyze these journal tags and suggest habits:
-                                
-                                Tags: {', '.join(tags)}
-                                
-                                Suggest 3 habits that could help based on these tags."""
-                                response = model.generate_content(prompt)
-                                st.markdown("### Suggested Habits")
-                                st.markdown(response.text)
+                        Suggest 3 habits that could help based on these tags."""
+                        
+                        def suggest_habits():
+                            if cancel_event.is_set():
+                                raise journal_analysis.AnalysisCancelled()
+                            return gemini.generate(prompt, "habits")
+                        futures[executor.submit(suggest_habits)] = "habits"
+                    
+                    # Clicking this reruns the fragment. The wait below updates
+                    # the page every POLL_SECONDS, which is where Streamlit
+                    # interrupts it; the finally block then sets cancel_event so
+                    # no further Gemini requests go out. A request already in
+                    # flight can't be aborted: it finishes in the background
+                    # and its result is dropped (a finished analysis is still
+                    # stored for next time).
+                    st.button("⏹ Cancel analysis", key="cancel_analysis")
+                    progress = st.empty()
+                    analysis_placeholder = st.empty()
+                    habits_placeholder = st.empty()
+                    analysis_placeholder.info("Analyzing your journal entries...")
+                    if tags:
+                        habits_placeholder.info("Suggesting habits...")
+                    
+                    pending = set(futures)
+                    started = time.monotonic()
+                    while pending:
+                        done, pending = concurrent.futures.wait(
+                            pending, timeout=POLL_SECONDS, return_when=concurrent.futures.FIRST_COMPLETED)
+                        
+                        # Redrawn on every wake-up, not just when progress
+                        # changes, so a Cancel click is noticed promptly
+                        waiting_for = {futures[f] for f in pending}
+                        elapsed = f"{time.monotonic() - started:.0f}s"
+                        if not waiting_for:
+                            progress.empty()
+                        elif ("analysis" in waiting_for and progress_state.get("total")
+                                and progress_state["done"] < progress_state["total"]):
+                            progress.progress(progress_state["done"] / progress_state["total"],
+                                              text=f"Summarizing {progress_state['total']} new period(s)... "
+                                                   f"{progress_state['done']}/{progress_state['total']} · {elapsed}")
+                        elif "analysis" in waiting_for:
+                            progress.caption(f"Writing the analysis... {elapsed}")
                         else:
-                            st.info("No entries found to analyze.")
-                    except Exception as e:
-                        st.error(f"Error analyzing entries: {e}")
-                    finally:
-                        if 'conn' in locals():
-                            conn.close()
+                            progress.caption(f"Suggesting habits... {elapsed}")
+                        
+                        for future in done:
+                            if futures[future] == "analysis":
+                                with analysis_placeholder.container():
+                                    try:
+                                        analysis, stats = future.result()
+                                        if analysis:
+                                            st.markdown(analysis)
+                                            st.caption(f"Covers {stats['chunks']} period(s) of entries, "
+                                                       f"{stats['summarized']} newly summarized")
+                                        else:
+                                            st.info("No entries found to analyze.")
+                                    except Exception as e:
+                                        st.error(f"Error analyzing entries: {e}")
+                            else:
+                                with habits_placeholder.container():
+                                    try:
+                                        habits = future.result()
+                                        st.markdown("### Suggested Habits")
+                                        st.markdown(habits)
+                                    except Exception as e:
+                                        st.error(f"Error suggesting habits: {e}")
+                except Exception as e:
+                    st.error(f"Error analyzing entries: {e}")
+                finally:
+                    if not all(future.done() for future in futures):
+                        cancel_event.set()
+                    executor.shutdown(wait=False, cancel_futures=True)
+        
+        ai_insights()
 
 # === CHAT TAB ===
-with tab3:
+# Nothing here reads the journal unless a search is run, so a chat turn costs
+# the same however many entries there are
+@st.fragment
+@tracing.traced("ui", "tab.chat")
+def chat_tab():
     st.title("💬 Chat with Gemini")
     st.markdown("Search across all tabs using the search box below")
     
@@ -635,39 +822,28 @@ with tab3:
                                 placeholder="Search journal entries, chats, etc.")
     
     if search_query:
-        with st.expander("🔍 Search Results", expanded=True):
+        with st.expander("🔍 Search Results", expanded=True), tracing.span("chat.search", "ui"):
             try:
-                import sqlite3
-                db_path = os.path.join(os.path.dirname(__file__), "journal_entries.db")
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-                
                 # Search journal entries
-                cursor.execute("""
-                SELECT timestamp, entry, mood 
-                FROM journal_entries 
-                WHERE entry LIKE ? 
-                ORDER BY timestamp DESC
-                LIMIT 5
-                """, (f"%{search_query}%",))
-                journal_results = cursor.fetchall()
+                journal_results = journal_db.search_entries(get_db(), search_query, limit=5)
                 
                 if journal_results:
                     st.markdown("### Journal Entries")
                     for result in journal_results:
                         with st.expander(f"{result[0]} - {result[2]}"):
+                            if result[3]:
+                                st.markdown(f"**Tags:** {result[3]}")
                             st.markdown(result[1])
                 else:
                     st.info("No matching journal entries found.")
                 
                 # Search chat history
                 if "messages" in st.session_state and st.session_state.messages:
-                    chat_results = [msg for msg in st.session_state.messages 
-                                   if search_query.lower() in msg["content"].lower()]
+                    chat_results = search_messages(st.session_state.messages, search_query, limit=5)
                     
                     if chat_results:
                         st.markdown("### Chat History")
-                        for msg in chat_results[:5]:  # Limit to 5 results
+                        for msg in chat_results:
                             with st.chat_message(msg["role"]):
                                 st.markdown(msg["content"])
                     else:
@@ -675,15 +851,36 @@ with tab3:
                 
             except Exception as e:
                 st.error(f"Search error: {e}")
-            finally:
-                if 'conn' in locals():
-                    conn.close()
     st.markdown("##### Interactive AI assistant for personalized guidance")
     
     # Initialize chat history and voice mode
     if "messages" not in st.session_state:
         st.session_state.messages = []
     
+    # Every message is also appended to the chat store as it happens; the
+    # stored session is created with the first message. The writes are queued
+    # without waiting for them, and a failed one is reported with the next
+    # message.
+    def record_message(role, content, **extra):
+        writer = get_writer()
+        st.session_state.messages.append({"role": role, "content": content, **extra})
+        last_write = st.session_state.get("chat_write")
+        if last_write is not None and last_write.done() and last_write.exception():
+            st.warning(f"Could not save an earlier chat message: {last_write.exception()}")
+        try:
+            if "chat_session_id" not in st.session_state:
+                session_id = chat_store.new_session_id()
+                writer.submit(chat_store.write_session, session_id)
+                st.session_state.chat_session_id = session_id
+            st.session_state.chat_write = writer.submit(
+                chat_store.write_message, st.session_state.chat_session_id, role, content, extra.get("timings"))
+        except Exception as e:
+            st.warning(f"Could not save the chat message: {e}")
+    
+    # What is actually sent to Gemini: recent turns plus a rolling summary
+    if "chat_context" not in st.session_state:
+        st.session_state.chat_context = chat_context.ChatContext(token_budget=CHAT_TOKEN_BUDGET)
+    
     if "voice_mode" not in st.session_state:
         st.session_state.voice_mode = False
     
@@ -691,7 +888,7 @@ with tab3:
     voice_mode = st.checkbox("🎤 Enable Voice Mode", value=st.session_state.voice_mode)
     if voice_mode != st.session_state.voice_mode:
         st.session_state.voice_mode = voice_mode
-        st.rerun()
+        st.rerun(scope="fragment")
     
     if st.session_state.voice_mode:
         st.info("Voice mode enabled. Your messages will be read aloud, and you can speak to the assistant.")
@@ -701,8 +898,10 @@ with tab3:
         st.session_state.voice_input = ""
     
     # Move templates to an expander with better styling
-    with st.expander("📋 Quick Start Templates", expanded=False):
+    with st.expander("📋 Quick Start Templates", expanded=False), tracing.span("chat.templates", "ui"):
         st.markdown("Select a template to quickly start a conversation on a specific topic:")
+        st.checkbox("Always ask Gemini for a fresh answer", key="fresh_responses",
+                    help="Skip the saved answers for prompts that have been asked before")
         
         # Create a more visual template selector with columns
         templates = {
@@ -722,6 +921,9 @@ with tab3:
             "Motivation Boost": "I'm feeling unmotivated today. Can you help me get back on track?"
         }
         
+        # Templates about the user's own day should never get a canned answer
+        fresh_templates = {"Daily Reflection", "Motivation Boost"}
+        
         # Create a 2-column layout for template buttons
         template_cols = st.columns(2)
         
@@ -730,7 +932,7 @@ with tab3:
             with template_cols[i % 2]:
                 if st.button(f"📝 {template_name}", key=f"template_{i}", use_container_width=True):
                     # Use the template
-                    st.session_state.messages.append({"role": "user", "content": template_text})
+                    record_message("user", template_text)
                     with st.chat_message("user"):
                         st.markdown(template_text)
                     
@@ -738,22 +940,32 @@ with tab3:
                     with st.chat_message("assistant"):
                         with st.spinner("Thinking..."):
                             try:
-                                chat = model.start_chat(history=[
-                                    {"role": m["role"], "parts": [m["content"]]} 
-                                    for m in st.session_state.messages[:-1]
-                                ])
+                                history = st.session_state.messages[:-1]
+                                use_cache = (template_name not in fresh_templates
+                                             and not st.session_state.get("fresh_responses"))
+                                cached = get_response_cache().get(get_gemini().model_name, history, template_text) if use_cache else None
                                 
-                                response = chat.send_message(template_text)
-                                st.markdown(response.text)
+                                if cached:
+                                    reply = cached
+                                else:
+                                    chat = st.session_state.chat_context.session(get_gemini(), history)
+                                    reply = get_gemini().send_message(chat, template_text, call_type="template")
+                                    if use_cache:
+                                        get_response_cache().put(get_gemini().model_name, history, template_text, reply)
+                                st.markdown(reply)
                                 
-                                # Add assistant response to chat history
-                                st.session_state.messages.append({"role": "assistant", "content": response.text})
+                                # Add assistant response to chat history. A cached
+                                # reply never reached the chat session, so it is
+                                # left out of sync and rebuilt on the next turn.
+                                record_message("assistant", reply)
+                                if not cached:
+                                    st.session_state.chat_context.commit(st.session_state.messages)
                             except Exception as e:
                                 error_msg = f"I'm sorry, I encountered an error: {e}"
                                 st.error(error_msg)
-                                st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                                record_message("assistant", error_msg)
                     
-                    st.rerun()
+                    st.rerun(scope="fragment")
     
     # Add a visual separator
     st.markdown("---")
@@ -761,7 +973,7 @@ with tab3:
     # Display chat history with better styling
     st.markdown("##### Conversation")
     chat_container = st.container()
-    with chat_container:
+    with chat_container, tracing.span("chat.history", "ui", messages=len(st.session_state.messages)):
         for message in st.session_state.messages:
             with st.chat_message(message["role"], avatar="🧑‍💻" if message["role"] == "user" else "🤖"):
                 st.markdown(message["content"])
@@ -769,7 +981,10 @@ with tab3:
     # Mobile-friendly button layout with better styling
     col1, col2 = st.columns([1, 1])
     with col1:
-        if st.button("💾 Save Chat", use_container_width=True):
+        # Messages are already stored as they are sent; this writes the
+        # session out as markdown, streamed from the database
+        if st.button("💾 Save Chat", use_container_width=True,
+                     disabled="chat_session_id" not in st.session_state):
             try:
                 # Create chats directory if it doesn't exist
                 chat_dir = os.path.join(os.path.dirname(__file__), "chats")
@@ -780,20 +995,29 @@ with tab3:
                 filename = f"chat_{timestamp}.md"
                 filepath = os.path.join(chat_dir, filename)
                 
-                # Format content
-                content = f"# Chat Session - {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                
-                for msg in st.session_state.messages:
-                    role = "User" if msg["role"] == "user" else "Gemini"
-                    content += f"## {role}\n{msg['content']}\n\n"
-                
-                # Write to file
+                get_writer().flush()  # The latest messages may still be queued
                 with open(filepath, "w", encoding="utf-8") as f:
-                    f.write(content)
+                    f.writelines(chat_store.iter_markdown(get_db(), st.session_state.chat_session_id))
                 
                 st.success(f"Chat saved to: {filepath}")
             except Exception as e:
                 st.error(f"Error saving chat: {e}")
+    with col2:
+        # Pick up an earlier conversation where it left off
+        with st.popover("🗂️ Past Chats", use_container_width=True):
+            past_sessions = chat_store.get_recent_sessions(get_db())
+            if past_sessions:
+                labels = {session_id: f"{updated_at} · {title or 'Untitled'} ({count} messages)"
+                          for session_id, title, updated_at, count in past_sessions}
+                resume_id = st.selectbox("Chat", options=list(labels), format_func=labels.get)
+                if st.button("Resume", use_container_width=True):
+                    st.session_state.chat_session_id = resume_id
+                    st.session_state.messages = chat_store.load_messages(get_db(), resume_id)
+                    st.session_state.messages_lower = []
+                    st.session_state.chat_context.reset()
+                    st.rerun(scope="fragment")
+            else:
+                st.markdown("No saved chats yet.")
     
     # Voice input for chat
     if st.session_state.voice_mode:
@@ -802,7 +1026,6 @@ with tab3:
         
         def process_voice_input(text):
             st.session_state.voice_input = text
-            st.rerun()
         
         voice_text = voice_input_button("chat_voice", callback=process_voice_input)
         if voice_text:
@@ -819,50 +1042,72 @@ with tab3:
     
     if prompt:
         # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        record_message("user", prompt)
         
         # Display user message
         with st.chat_message("user"):
             st.markdown(prompt)
         
         # Display assistant response with streaming
-        with st.chat_message("assistant"):
+        with st.chat_message("assistant"), tracing.span("chat.respond", "ui"):
             message_placeholder = st.empty()
-            full_response = ""
+            audio_placeholder = st.empty()
+            renderer = chat_stream.StreamRenderer(message_placeholder)
+            
+            # In voice mode, speak each sentence as soon as it has streamed in
+            speech = None
+            if st.session_state.voice_mode:
+                speech = tts_service.SentenceStream(get_tts(), get_session_id())
             
             try:
-                # Create a streaming response
-                chat = model.start_chat(history=[
-                    {"role": m["role"], "parts": [m["content"]]} 
-                    for m in st.session_state.messages[:-1]  # Exclude the latest user message
-                ])
+                history = st.session_state.messages[:-1]  # Exclude the latest user message
+                cached = None
+                if not st.session_state.get("fresh_responses"):
+                    cached = get_response_cache().get(get_gemini().model_name, history, prompt)
                 
-                response = chat.send_message(
-                    prompt,
-                    stream=True
-                )
+                # Create a streaming response, unless this exact prompt was
+                # answered before with the same history
+                renderer.start()
+                if cached:
+                    response = [cached]
+                else:
+                    chat = st.session_state.chat_context.session(get_gemini(), history)
+                    response = get_gemini().stream_message(chat, prompt)
                 
-                # Simulate streaming by incrementally revealing the response
-                for chunk in response:
-                    if hasattr(chunk, 'text'):
-                        text_chunk = chunk.text
-                        full_response += text_chunk
-                        message_placeholder.markdown(full_response + "▌")
-                        time.sleep(0.01)  # Small delay to simulate typing
+                # Reveal the response as it streams in, redrawing at a capped rate
+                for text_chunk in response:
+                    if text_chunk:
+                        renderer.add(text_chunk)
+                        
+                        if speech:
+                            speech.feed(text_chunk)
+                            results = get_tts().collect(get_session_id())
+                            if results:
+                                with audio_placeholder.container():
+                                    play_tts_results(results)
                 
                 # Display the final response
-                message_placeholder.markdown(full_response)
+                full_response = renderer.finish()
+                timings = renderer.timings()
+                if timings["time_to_first_token"] is not None:
+                    st.caption(f"First token in {timings['time_to_first_token']:.1f}s · "
+                               f"{timings['total_time']:.1f}s total")
                 
                 # Add assistant response to chat history
-                st.session_state.messages.append({"role": "assistant", "content": full_response})
+                record_message("assistant", full_response, timings=timings)
+                if not cached:
+                    st.session_state.chat_context.commit(st.session_state.messages)
+                    if not st.session_state.get("fresh_responses"):
+                        get_response_cache().put(get_gemini().model_name, history, prompt, full_response)
                 
-                # Read response aloud if voice mode is enabled
-                if st.session_state.voice_mode:
-                    text_to_speech(full_response)
+                # Queue the last sentence; anything still synthesizing is
+                # picked up by the player at the bottom of this tab
+                if speech:
+                    speech.finish()
                 
             except Exception as e:
                 st.error(f"Error generating response: {e}")
-                st.session_state.messages.append({"role": "assistant", "content": f"I'm sorry, I encountered an error: {e}"})
+                record_message("assistant", f"I'm sorry, I encountered an error: {e}")
     
     # Voice controls for past messages
     if st.session_state.voice_mode and st.session_state.messages:
@@ -888,4 +1133,79 @@ with tab3:
     # Add a button to clear chat history
     if st.button("Clear Chat History"):
         st.session_state.messages = []
-        st.rerun()
+        st.session_state.messages_lower = []
+        st.session_state.chat_context.reset()
+        # The cleared conversation stays in the store; new messages start a new session
+        st.session_state.pop("chat_session_id", None)
+        st.rerun(scope="fragment")
+    
+    # Speech asked for in this tab, including voice mode replies
+    render_tts_player()
+
+# Process-wide stats and controls in the sidebar
+def render_sidebar():
+    # Cold-start report: how long each heavy library took to import in this process
+    with st.sidebar.expander("⏱️ Import times"):
+        for module_name, elapsed_ms in import_report():
+            st.markdown(f"`{module_name}` {elapsed_ms:.0f} ms")
+
+    # Gemini call counts and latency per call type, for this process
+    gemini_metrics = get_gemini().metrics()
+    if gemini_metrics:
+        with st.sidebar.expander("📡 Gemini calls"):
+            for call_type, m in sorted(gemini_metrics.items()):
+                line = f"**{call_type}**: {m['calls']} calls, {m['errors']} errors, {m['retries']} retries"
+                if m["p50_latency"] is not None:
+                    line += f", p50 ≤ {m['p50_latency']:g}s, p95 ≤ {m['p95_latency']:g}s"
+                if m["p50_first_chunk"] is not None:
+                    line += f", first chunk p50 ≤ {m['p50_first_chunk']:g}s"
+                st.markdown(line)
+
+    # Audio cache sizing, once this session has used speech
+    if "session_id" in st.session_state:
+        with st.sidebar.expander("🔊 Audio cache"):
+            stats = get_tts().cache.stats()
+            st.markdown(f"{stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+            st.markdown(f"{stats['entries']} clips, {stats['bytes'] / 1024 / 1024:.1f} of "
+                        f"{stats['max_bytes'] / 1024 / 1024:.0f} MB, {stats['evictions']} evicted")
+
+    # Group commits by the database writer, for this process
+    writer_stats = get_writer().stats()
+    if writer_stats["writes"]:
+        with st.sidebar.expander("💾 Database writes"):
+            st.markdown(f"{writer_stats['writes']} writes in {writer_stats['commits']} commits "
+                        f"(largest group {writer_stats['largest_batch']}), {writer_stats['failed']} failed, "
+                        f"{writer_stats['pending']} queued")
+
+    # The speech threshold is calibrated on first use and kept for the process;
+    # this redoes it, e.g. after moving somewhere noisier or quieter
+    with st.sidebar.expander("🎙️ Microphone"):
+        if st.button("Recalibrate microphone", key="recalibrate_mic",
+                     help="Measure the background noise again before the next recording"):
+            get_stt().recalibrate()
+            st.caption("The next recording will calibrate for background noise first.")
+
+# === PAGE ===
+# The run's spans are collected until here whether or not it gets to the end:
+# a run cut short by st.rerun() or st.stop() would otherwise leave its
+# collection open, and later fragment reruns on this thread would keep adding
+# spans to it
+try:
+    with tab1:
+        journal_tab()
+    with tab2:
+        view_entries_tab()
+    with tab3:
+        chat_tab()
+    render_sidebar()
+finally:
+    trace = tracing.finish_run()
+
+# Where this run's time went, when tracing is on
+if trace:
+    run_seconds, spans = trace
+    with st.sidebar.expander(f"🧭 Rerun timings ({run_seconds * 1000:.0f} ms)"):
+        st.markdown(" · ".join(f"**{category}** {ms:.0f} ms"
+                               for category, ms in tracing.totals_by_category(spans)))
+        st.code("\n".join(f"{'  ' * item['depth']}{item['name']:<{48 - 2 * item['depth']}} {item['duration_ms']:9.1f} ms"
+                           for item in spans), language=None)
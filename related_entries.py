@@ -0,0 +1,252 @@
+import logging
+import os
+import re
+import threading
+
+import journal_db
+from lazy_imports import timed_import
+
+# === RELATED ENTRIES INDEX ===
+# Local TF-IDF index over the journal, used for the "Related entries" panel.
+# Runs entirely offline. The term matrix is kept as compressed sparse rows in
+# plain NumPy arrays (one row per entry):
+#   indptr[i]:indptr[i + 1]  slice of row i in `terms` / `counts`
+#   terms                    vocabulary id of each stored term
+#   counts                   how often that term occurs in the entry
+# Similarity is cosine over sublinear-tf * idf weights, computed for a batch
+# of query entries at once with vectorized array operations rather than a
+# Python loop over entries. New entries are appended as they are saved; the
+# arrays are persisted to an .npz file and topped up from the database on
+# startup.
+
+logger = logging.getLogger(__name__)
+
+TOKEN = re.compile(r"[^\W\d_]{2,30}")
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves also really today feel felt like get got going went one
+""".split())
+
+# Upper bound on the cells of the intermediate arrays (the score matrix and
+# each dense block of entries), which keeps them to a few tens of MB
+MAX_BLOCK_CELLS = 4_000_000
+
+
+def tokenize(text):
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def entry_text(entry, tags):
+    return f"{entry} {tags or ''}"
+
+
+class RelatedEntriesIndex:
+    def __init__(self, path=None):
+        self.np = timed_import("numpy")
+        self.path = path
+        self.vocabulary = {}
+        self.data_version = None
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        np = self.np
+        self.vocabulary = {}
+        self.entry_ids = np.zeros(0, dtype=np.int64)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.terms = np.zeros(0, dtype=np.int32)
+        self.counts = np.zeros(0, dtype=np.float32)
+        self._pending = []  # (entry_id, term ids, counts) not yet merged into the arrays
+        self._last_id = 0
+        self._weights = None  # Derived arrays, rebuilt lazily after changes
+
+    def __len__(self):
+        return len(self.entry_ids) + len(self._pending)
+
+    # === BUILDING ===
+    # Entries are added in id order; an id that is already indexed (e.g. picked
+    # up by sync() before the saving session got to it) is ignored
+    def add(self, entry_id, text):
+        np = self.np
+        with self._lock:
+            if entry_id <= self._last_id:
+                return
+            self._last_id = entry_id
+            ids = [self.vocabulary.setdefault(t, len(self.vocabulary)) for t in tokenize(text)]
+            term_ids, counts = np.unique(np.array(ids, dtype=np.int32), return_counts=True)
+            self._pending.append((entry_id, term_ids, counts.astype(np.float32)))
+            self._weights = None
+
+    def _merge_pending(self):
+        if not self._pending:
+            return
+        np = self.np
+        entry_ids, term_rows, count_rows = zip(*self._pending)
+        lengths = np.array([len(r) for r in term_rows], dtype=np.int64)
+        self.entry_ids = np.concatenate([self.entry_ids, np.array(entry_ids, dtype=np.int64)])
+        self.indptr = np.concatenate([self.indptr, self.indptr[-1] + np.cumsum(lengths)])
+        self.terms = np.concatenate([self.terms] + list(term_rows)).astype(np.int32)
+        self.counts = np.concatenate([self.counts] + list(count_rows)).astype(np.float32)
+        self._pending = []
+
+    # Per-stored-term weights and row norms, recomputed after any change
+    # because idf depends on the whole corpus
+    def _prepare(self):
+        if self._weights is not None:
+            return
+        np = self.np
+        self._merge_pending()
+        n_docs = len(self.entry_ids)
+        doc_freq = np.bincount(self.terms, minlength=len(self.vocabulary)).astype(np.float32)
+        self._idf = np.log((1 + n_docs) / (1 + doc_freq)) + 1
+        weights = (1 + np.log(self.counts)) * self._idf[self.terms]
+        self._rows = np.repeat(np.arange(n_docs, dtype=np.int64), np.diff(self.indptr))
+        norms = np.sqrt(np.bincount(self._rows, weights=weights * weights, minlength=n_docs))
+        norms[norms == 0] = 1
+        self._weights = (weights / norms[self._rows]).astype(np.float32)
+        self._row_of = {int(e): i for i, e in enumerate(self.entry_ids)}
+
+    # Bring the index up to date with journal_entries. Entries newer than the
+    # last indexed id are appended; if anything else changed, rebuild.
+    def sync(self, pool):
+        with self._lock:
+            version = journal_db.get_data_version(pool)
+            if version == self.data_version:
+                return
+            indexed = len(self)
+            for entry_id, entry, tags in journal_db.iter_entries_after(pool, self._last_id):
+                self.add(entry_id, entry_text(entry, tags))
+            changed = len(self) != indexed
+            if len(self) != journal_db.count_entries(pool):
+                logger.info("Related entries index out of date, rebuilding")
+                self._reset()
+                for entry_id, entry, tags in journal_db.iter_entries_after(pool, 0):
+                    self.add(entry_id, entry_text(entry, tags))
+                changed = True
+            self.data_version = version
+            # Entries added as they were saved are written out at exit instead
+            if changed:
+                self.save()
+
+    # === QUERIES ===
+    # Returns {entry_id: [(related_id, score), ...]} for each indexed entry in
+    # entry_ids, best match first
+    def similar_batch(self, entry_ids, k=3, min_score=0.05):
+        np = self.np
+        with self._lock:
+            self._prepare()
+            rows = [self._row_of[e] for e in entry_ids if e in self._row_of]
+            results = {}
+            if not rows:
+                return results
+            # Each query is one of the already-weighted rows of the matrix
+            per_batch = max(1, MAX_BLOCK_CELLS // max(len(self.entry_ids), 1))
+            for start in range(0, len(rows), per_batch):
+                batch = rows[start:start + per_batch]
+                scores = self._score_rows(
+                    [self.terms[self.indptr[r]:self.indptr[r + 1]] for r in batch],
+                    [self._weights[self.indptr[r]:self.indptr[r + 1]] for r in batch],
+                )
+                scores[np.arange(len(batch)), batch] = 0  # An entry isn't related to itself
+                for query_row, row_scores in zip(batch, scores):
+                    results[int(self.entry_ids[query_row])] = self._top_k(row_scores, k, min_score)
+            return results
+
+    def similar_to_entry(self, entry_id, k=3, min_score=0.05):
+        return self.similar_batch([entry_id], k, min_score).get(entry_id, [])
+
+    # Entries most similar to free text, e.g. a draft that hasn't been saved
+    def query(self, text, k=5, min_score=0.05):
+        np = self.np
+        with self._lock:
+            self._prepare()
+            ids = [self.vocabulary[t] for t in tokenize(text) if t in self.vocabulary]
+            if not ids or not len(self.entry_ids):
+                return []
+            terms, counts = np.unique(np.array(ids, dtype=np.int32), return_counts=True)
+            weights = (1 + np.log(counts)) * self._idf[terms]
+            weights /= np.linalg.norm(weights) or 1
+            return self._top_k(self._score_rows([terms], [weights])[0], k, min_score)
+
+    # Cosine scores of each query vector (given as parallel term/weight
+    # arrays) against every entry. Returns an array of shape (queries, entries).
+    def _score_rows(self, query_terms, query_weights):
+        np = self.np
+        n_docs = len(self.entry_ids)
+        vocab_terms = np.unique(np.concatenate(query_terms))
+        if not len(vocab_terms):
+            # No query has an indexed term (e.g. an empty entry), so nothing matches
+            return np.zeros((len(query_terms), n_docs), dtype=np.float32)
+        # Dense query matrix over just the terms that appear in some query
+        column = np.full(len(self.vocabulary), -1, dtype=np.int64)
+        column[vocab_terms] = np.arange(len(vocab_terms))
+        queries = np.zeros((len(query_terms), len(vocab_terms)), dtype=np.float32)
+        for i, (terms, weights) in enumerate(zip(query_terms, query_weights)):
+            queries[i, column[terms]] = weights
+        # Stored terms that can contribute to any score, in row order
+        hits = np.flatnonzero(column[self.terms] >= 0)
+        rows, columns, weights = self._rows[hits], column[self.terms[hits]], self._weights[hits]
+        # Entries are scored a block at a time: the block's rows of the
+        # entry-term matrix, restricted to the query terms, are expanded into
+        # a dense array and multiplied with the query matrix in one matmul
+        scores = np.empty((len(query_terms), n_docs), dtype=np.float32)
+        block_size = max(1, MAX_BLOCK_CELLS // len(vocab_terms))
+        for start in range(0, n_docs, block_size):
+            end = min(start + block_size, n_docs)
+            lo, hi = np.searchsorted(rows, [start, end])
+            block = np.zeros((end - start, len(vocab_terms)), dtype=np.float32)
+            block[rows[lo:hi] - start, columns[lo:hi]] = weights[lo:hi]
+            scores[:, start:end] = queries @ block.T
+        return scores
+
+    def _top_k(self, scores, k, min_score):
+        np = self.np
+        k = min(k, len(scores))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.entry_ids[i]), float(scores[i])) for i in top if scores[i] >= min_score]
+
+    # === PERSISTENCE ===
+    def save(self):
+        if not self.path:
+            return
+        np = self.np
+        with self._lock:
+            self._merge_pending()
+            terms = sorted(self.vocabulary, key=self.vocabulary.get)
+            tmp_path = self.path + ".tmp.npz"
+            np.savez_compressed(
+                tmp_path,
+                entry_ids=self.entry_ids, indptr=self.indptr, terms=self.terms, counts=self.counts,
+                vocabulary=np.array(terms, dtype=str),
+                data_version=np.array([-1 if self.data_version is None else self.data_version]),
+            )
+            os.replace(tmp_path, self.path)
+
+    @classmethod
+    def load(cls, path):
+        index = cls(path)
+        if not os.path.exists(path):
+            return index
+        np = index.np
+        try:
+            with np.load(path) as saved:
+                index.entry_ids = saved["entry_ids"]
+                index.indptr = saved["indptr"]
+                index.terms = saved["terms"]
+                index.counts = saved["counts"]
+                index.vocabulary = {str(t): i for i, t in enumerate(saved["vocabulary"])}
+                index._last_id = int(index.entry_ids.max(initial=0))
+                version = int(saved["data_version"][0])
+                index.data_version = None if version < 0 else version
+        except Exception as e:
+            logger.warning("Could not load the related entries index, rebuilding: %s", e)
+            index._reset()
+        return index
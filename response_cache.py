@@ -0,0 +1,106 @@
+import hashlib
+import json
+import time
+
+import journal_db
+import tracing
+
+# === GEMINI RESPONSE CACHE ===
+# Persistent cache of model replies keyed on (model name, normalized history,
+# prompt). Quick Start templates are fixed prompts usually sent with an empty
+# history, so after the first click they are answered from here without
+# spending API quota. Kept in its own SQLite file so cache writes never
+# contend with journal saves.
+
+DEFAULT_TTL = 7 * 24 * 3600.0
+DEFAULT_MAX_ENTRIES = 500
+
+CREATE_CACHE_TABLE = """
+CREATE TABLE IF NOT EXISTS response_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID
+"""
+
+CREATE_LAST_USED_INDEX = "CREATE INDEX IF NOT EXISTS idx_response_cache_last_used ON response_cache (last_used)"
+
+SELECT_RESPONSE = "SELECT response FROM response_cache WHERE key = ? AND created_at >= ?"
+
+TOUCH_RESPONSE = "UPDATE response_cache SET last_used = ?, hits = hits + 1 WHERE key = ?"
+
+UPSERT_RESPONSE = """
+INSERT INTO response_cache (key, model, prompt, response, created_at, last_used)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(key) DO UPDATE SET
+    response = excluded.response,
+    created_at = excluded.created_at,
+    last_used = excluded.last_used
+"""
+
+DELETE_EXPIRED = "DELETE FROM response_cache WHERE created_at < ?"
+
+# Drop the least recently used rows beyond max_entries
+DELETE_OVERFLOW = """
+DELETE FROM response_cache WHERE key IN (
+    SELECT key FROM response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+)
+"""
+
+
+# Whitespace and formatting differences shouldn't split the cache
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def cache_key(model_name, history, prompt):
+    payload = json.dumps({
+        "model": model_name,
+        "history": [[m["role"], _normalize(m["content"])] for m in history],
+        "prompt": _normalize(prompt),
+    }, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, db_path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.pool = journal_db.ConnectionPool(db_path, size=2)
+        with self.pool.transaction() as conn:
+            conn.execute(CREATE_CACHE_TABLE)
+            conn.execute(CREATE_LAST_USED_INDEX)
+            conn.execute(DELETE_EXPIRED, (time.time() - self.ttl,))
+
+    @tracing.traced("cache")
+    def get(self, model_name, history, prompt):
+        key = cache_key(model_name, history, prompt)
+        now = time.time()
+        with self.pool.connection() as conn:
+            row = conn.execute(SELECT_RESPONSE, (key, now - self.ttl)).fetchone()
+            if row:
+                conn.execute(TOUCH_RESPONSE, (now, key))
+        if row:
+            self.hits += 1
+            return row[0]
+        self.misses += 1
+        return None
+
+    @tracing.traced("cache")
+    def put(self, model_name, history, prompt, response):
+        key = cache_key(model_name, history, prompt)
+        now = time.time()
+        with self.pool.transaction() as conn:
+            conn.execute(UPSERT_RESPONSE, (key, model_name, prompt, response, now, now))
+            conn.execute(DELETE_EXPIRED, (now - self.ttl,))
+            conn.execute(DELETE_OVERFLOW, (self.max_entries,))
+
+    def clear(self):
+        with self.pool.transaction() as conn:
+            conn.execute("DELETE FROM response_cache")
@@ -0,0 +1,433 @@
+import array
+import collections
+import contextlib
+import itertools
+import logging
+import math
+import queue
+import sys
+import threading
+import time
+import wave
+
+import tracing
+from lazy_imports import timed_import
+
+# === SPEECH-TO-TEXT SERVICE ===
+# One SpeechCaptureService per process (the app creates it through
+# st.cache_resource), the counterpart of the TTS service. A session submits a
+# capture request and its script run carries on straight away. The capture
+# thread records one phrase from the audio source and hands it to the
+# transcription thread, so the next recording can start while the last one is
+# still being recognized. Both post status updates, which the session's next
+# script run picks up along with the finished transcript.
+#
+# Speech is detected on the streamed frames with an energy threshold. The
+# threshold is calibrated from the ambient noise the first time a source is
+# used and then reused, rather than sampling half a second of silence before
+# every recording. A recording that hears no speech throws the calibration
+# away, so one taken while someone was already talking (or in a noisier room)
+# doesn't keep every later recording deaf.
+
+logger = logging.getLogger(__name__)
+
+# Capture requests waiting for the source across all sessions; submit()
+# refuses new ones beyond this
+DEFAULT_QUEUE_SIZE = 4
+# Transcripts and statuses of sessions that haven't collected them for this
+# long are forgotten
+RESULT_TTL = 600.0
+
+LISTEN_TIMEOUT = 5.0  # Seconds to wait for speech to start
+PHRASE_TIME_LIMIT = 10.0  # Longest phrase recorded
+PAUSE_SECONDS = 0.8  # Silence that ends a phrase
+PRE_ROLL_SECONDS = 0.5  # Quiet audio kept before and after the phrase, so it isn't clipped
+MIN_PHRASE_SECONDS = 0.3  # Bursts of sound shorter than this are treated as noise
+CALIBRATION_SECONDS = 0.5
+# Speech has to be this much louder than the calibrated ambient noise, and at
+# least MIN_ENERGY_THRESHOLD (so digital silence doesn't make every click speech).
+# Calibrating over speech would put the threshold above normal speaking volume,
+# so it is capped at MAX_ENERGY_THRESHOLD (in 16-bit sample units).
+ENERGY_RATIO = 1.5
+MIN_ENERGY_THRESHOLD = 50.0
+MAX_ENERGY_THRESHOLD = 4000.0
+
+_STOP = object()
+
+
+class CaptureQueueFull(Exception):
+    pass
+
+
+# Raised by engines when the audio held no recognizable speech
+class SpeechNotUnderstood(Exception):
+    pass
+
+
+# read() returns the next frame of raw PCM, or b"" once the source runs out
+AudioStream = collections.namedtuple("AudioStream", "sample_rate sample_width read")
+
+
+class CapturedAudio(collections.namedtuple("CapturedAudio", "data sample_rate sample_width")):
+    @property
+    def seconds(self):
+        return len(self.data) / (self.sample_rate * self.sample_width)
+
+
+# The default microphone, through speech_recognition's PyAudio wrapper
+class MicrophoneSource:
+    name = "microphone"
+
+    def __init__(self, device_index=None, sample_rate=None, chunk_size=1024):
+        self.device_index = device_index
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+
+    @contextlib.contextmanager
+    def open(self):
+        sr = timed_import("speech_recognition")
+        with sr.Microphone(device_index=self.device_index, sample_rate=self.sample_rate,
+                           chunk_size=self.chunk_size) as mic:
+            yield AudioStream(mic.SAMPLE_RATE, mic.SAMPLE_WIDTH, lambda: mic.stream.read(mic.CHUNK))
+
+
+# A prerecorded mono WAV file. With realtime set, frames are delivered at the
+# speed they were recorded, as a microphone would.
+class WavFileSource:
+    def __init__(self, path, chunk_size=1024, realtime=False):
+        self.path = path
+        self.name = f"wav:{path}"
+        self.chunk_size = chunk_size
+        self.realtime = realtime
+
+    @contextlib.contextmanager
+    def open(self):
+        with wave.open(self.path, "rb") as f:
+            if f.getnchannels() != 1:
+                raise ValueError(f"{self.path} has {f.getnchannels()} channels, only mono is supported")
+            sample_rate = f.getframerate()
+
+            def read():
+                frame = f.readframes(self.chunk_size)
+                if self.realtime and frame:
+                    time.sleep(self.chunk_size / sample_rate)
+                return frame
+
+            yield AudioStream(sample_rate, f.getsampwidth(), read)
+
+
+class GoogleEngine:
+    name = "google"
+
+    def __init__(self):
+        self._recognizer = None
+
+    def transcribe(self, audio, sample_rate, sample_width, language="en-US"):
+        sr = timed_import("speech_recognition")
+        if self._recognizer is None:
+            self._recognizer = sr.Recognizer()
+        try:
+            return self._recognizer.recognize_google(sr.AudioData(audio, sample_rate, sample_width),
+                                                     language=language)
+        except sr.UnknownValueError:
+            raise SpeechNotUnderstood()
+
+
+# Offline stand-in for tests and development. Returns `text` (or text(audio,
+# sample_rate, sample_width) if it is callable) after `delay` seconds, and
+# keeps every clip it was given in `received`.
+class StubEngine:
+    name = "stub"
+
+    def __init__(self, text="This is a test transcript.", delay=0.0):
+        self.text = text
+        self.delay = delay
+        self.received = []
+
+    def transcribe(self, audio, sample_rate, sample_width, language="en-US"):
+        self.received.append(CapturedAudio(audio, sample_rate, sample_width))
+        if self.delay:
+            time.sleep(self.delay)
+        text = self.text(audio, sample_rate, sample_width) if callable(self.text) else self.text
+        if not text:
+            raise SpeechNotUnderstood()
+        return text
+
+
+# === VOICE ACTIVITY DETECTION ===
+_SAMPLE_TYPES = {2: "h", 4: "i"}
+
+
+# Root-mean-square amplitude of one frame of PCM
+def frame_energy(frame, sample_width):
+    if sample_width == 1:
+        samples = [b - 128 for b in frame]  # 8-bit WAV is unsigned
+    elif sample_width in _SAMPLE_TYPES:
+        samples = array.array(_SAMPLE_TYPES[sample_width], frame[:len(frame) - len(frame) % sample_width])
+        if sys.byteorder == "big":
+            samples.byteswap()  # PCM is little-endian
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width} bytes")
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+# Energy threshold from `seconds` of ambient sound at the start of the stream
+def calibrate(stream, seconds=CALIBRATION_SECONDS):
+    bytes_per_second = stream.sample_rate * stream.sample_width
+    energies = []
+    heard = 0.0
+    while heard < seconds:
+        frame = stream.read()
+        if not frame:
+            break
+        energies.append(frame_energy(frame, stream.sample_width))
+        heard += len(frame) / bytes_per_second
+    ambient = sum(energies) / len(energies) if energies else 0.0
+    return min(MAX_ENERGY_THRESHOLD, max(MIN_ENERGY_THRESHOLD, ambient * ENERGY_RATIO))
+
+
+# Read frames until one phrase has been spoken: it starts with the first loud
+# frame and ends after PAUSE_SECONDS of quiet or at phrase_time_limit.
+# Returns CapturedAudio, or None if nothing louder than `threshold` (and
+# longer than MIN_PHRASE_SECONDS) was heard within `timeout` seconds, the
+# stream ran out or `stop` was set.
+def listen(stream, threshold, timeout=LISTEN_TIMEOUT, phrase_time_limit=PHRASE_TIME_LIMIT, stop=None):
+    bytes_per_second = stream.sample_rate * stream.sample_width
+    pre_roll = collections.deque()  # Recent quiet frames, prepended once speech starts
+    pre_roll_seconds = 0.0
+    waited = 0.0
+    phrase = []
+    phrase_seconds = speech_seconds = silence_seconds = 0.0
+    quiet_tail = 0  # Quiet frames at the end of the phrase
+
+    while stop is None or not stop.is_set():
+        frame = stream.read()
+        if not frame:
+            break
+        seconds = len(frame) / bytes_per_second
+        loud = frame_energy(frame, stream.sample_width) > threshold
+
+        if not phrase:
+            if loud:
+                phrase = list(pre_roll) + [frame]
+                phrase_seconds = speech_seconds = seconds
+                silence_seconds = 0.0
+                quiet_tail = 0
+                continue
+            waited += seconds
+            if waited >= timeout:
+                return None
+            pre_roll.append(frame)
+            pre_roll_seconds += seconds
+            while pre_roll_seconds > PRE_ROLL_SECONDS:
+                pre_roll_seconds -= len(pre_roll.popleft()) / bytes_per_second
+            continue
+
+        phrase.append(frame)
+        phrase_seconds += seconds
+        if loud:
+            speech_seconds += seconds
+            silence_seconds = 0.0
+            quiet_tail = 0
+        else:
+            silence_seconds += seconds
+            quiet_tail += 1
+
+        if silence_seconds >= PAUSE_SECONDS or phrase_seconds >= phrase_time_limit:
+            if speech_seconds >= MIN_PHRASE_SECONDS:
+                break
+            # Only a click or a bump: go back to waiting for speech
+            waited += phrase_seconds
+            if waited >= timeout:
+                return None
+            phrase = []
+            pre_roll.clear()
+            pre_roll_seconds = 0.0
+    else:
+        return None
+
+    if not phrase or speech_seconds < MIN_PHRASE_SECONDS:
+        return None
+    # Keep PRE_ROLL_SECONDS of the trailing quiet, drop the rest
+    frame_seconds = len(phrase[-1]) / bytes_per_second or 1.0
+    drop = quiet_tail - min(quiet_tail, math.ceil(PRE_ROLL_SECONDS / frame_seconds))
+    if drop:
+        del phrase[-drop:]
+    return CapturedAudio(b"".join(phrase), stream.sample_rate, stream.sample_width)
+
+
+# request_id is unique per submit(), so a session can tell its transcripts apart
+Transcript = collections.namedtuple("Transcript", "request_id text status created")
+_request_ids = itertools.count(1)
+
+
+class SpeechCaptureService:
+    def __init__(self, source=None, engine=None, energy_threshold=None, queue_size=DEFAULT_QUEUE_SIZE,
+                 listen_timeout=LISTEN_TIMEOUT, phrase_time_limit=PHRASE_TIME_LIMIT):
+        self.source = source or MicrophoneSource()
+        self.engine = engine or GoogleEngine()
+        # A fixed threshold skips calibration altogether
+        self.energy_threshold = energy_threshold
+        self.listen_timeout = listen_timeout
+        self.phrase_time_limit = phrase_time_limit
+        self._thresholds = {}  # source name -> calibrated threshold
+        self._captures = queue.Queue(maxsize=queue_size)
+        self._transcriptions = queue.Queue()
+        self._status = {}  # session_id -> (message, time)
+        self._results = {}
+        self._pending = collections.Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._capture_worker = threading.Thread(target=self._capture_loop, name="stt-capture", daemon=True)
+        self._transcribe_worker = threading.Thread(target=self._transcribe_loop, name="stt-transcribe",
+                                                   daemon=True)
+        self._capture_worker.start()
+        self._transcribe_worker.start()
+
+    # Queue a recording for this session and return its request id without
+    # waiting for it. Raises CaptureQueueFull when too many are already queued.
+    # `source` overrides the service's source for this one recording.
+    def submit(self, session_id, language="en-US", source=None):
+        if self._stop.is_set() or not self._capture_worker.is_alive():
+            raise RuntimeError("Speech capture service is shut down")
+        request_id = next(_request_ids)
+        with self._lock:
+            self._pending[session_id] += 1
+        self._set_status(session_id, "Waiting for the microphone..." if self._captures.qsize() else "Starting...")
+        try:
+            self._captures.put_nowait((request_id, session_id, source or self.source, language))
+        except queue.Full:
+            self._done(session_id)
+            self._set_status(session_id, "Ready")
+            raise CaptureQueueFull("The microphone is busy, try again in a moment")
+        return request_id
+
+    def pending(self, session_id):
+        with self._lock:
+            return self._pending[session_id]
+
+    # Latest status message for this session, or None if it never recorded
+    def status(self, session_id):
+        with self._lock:
+            status = self._status.get(session_id)
+        return status[0] if status else None
+
+    # Take every finished transcript for this session, oldest first
+    def collect(self, session_id):
+        with self._lock:
+            results = self._results.pop(session_id, None)
+        return results or []
+
+    # Forget the calibrated threshold, e.g. after moving to a noisier room.
+    # The next recording from that source calibrates again.
+    def recalibrate(self, source=None):
+        self._thresholds.pop((source or self.source).name, None)
+
+    # Record one phrase from `source`, calling on_status(message) as it goes.
+    # Runs on the calling thread; the worker uses it for every request.
+    def capture(self, source=None, on_status=None):
+        source = source or self.source
+        on_status = on_status or (lambda message: None)
+        with source.open() as stream:
+            threshold = self.energy_threshold
+            if threshold is None:
+                threshold = self._thresholds.get(source.name)
+            if threshold is None:
+                on_status("Calibrating for background noise...")
+                with tracing.span("stt.calibrate", "speech", source=source.name):
+                    threshold = self._thresholds[source.name] = calibrate(stream)
+            on_status("Listening...")
+            audio = listen(stream, threshold, self.listen_timeout, self.phrase_time_limit, self._stop)
+        if audio is None and self.energy_threshold is None and not self._stop.is_set():
+            # Possibly calibrated too high to hear anyone: calibrate again next time
+            self.recalibrate(source)
+        return audio
+
+    # Returns (text, status message); text is "" when nothing was recognized
+    def transcribe(self, audio, language="en-US"):
+        try:
+            with tracing.span("stt.recognize", "speech", engine=self.engine.name, seconds=audio.seconds):
+                text = self.engine.transcribe(audio.data, audio.sample_rate, audio.sample_width, language)
+        except SpeechNotUnderstood:
+            return "", "Could not understand audio"
+        except Exception as e:
+            logger.warning("Speech engine %s failed: %s", self.engine.name, e)
+            return "", f"Error: {e}"
+        return text, "Done"
+
+    def _set_status(self, session_id, message):
+        with self._lock:
+            self._status[session_id] = (message, time.monotonic())
+
+    def _finish(self, request_id, session_id, text, status):
+        result = Transcript(request_id, text, status, time.monotonic())
+        with self._lock:
+            self._results.setdefault(session_id, []).append(result)
+            self._status[session_id] = (status, result.created)
+            self._pending[session_id] -= 1
+            if not self._pending[session_id]:
+                del self._pending[session_id]
+            self._prune()
+
+    def _done(self, session_id):
+        with self._lock:
+            self._pending[session_id] -= 1
+            if not self._pending[session_id]:
+                del self._pending[session_id]
+
+    def _capture_loop(self):
+        while True:
+            item = self._captures.get()
+            if item is _STOP:
+                self._transcriptions.put(_STOP)
+                break
+            request_id, session_id, source, language = item
+            if self._stop.is_set():
+                self._finish(request_id, session_id, "", "Cancelled")
+                continue
+            try:
+                with tracing.span("stt.listen", "speech", source=source.name):
+                    audio = self.capture(source, lambda message: self._set_status(session_id, message))
+            except Exception as e:
+                logger.warning("Speech capture from %s failed: %s", source.name, e)
+                self._finish(request_id, session_id, "", f"Error: {e}")
+                continue
+            if audio is None:
+                self._finish(request_id, session_id, "", "Cancelled" if self._stop.is_set() else "No speech detected")
+                continue
+            self._set_status(session_id, "Processing...")
+            self._transcriptions.put((request_id, session_id, audio, language))
+
+    def _transcribe_loop(self):
+        while True:
+            item = self._transcriptions.get()
+            if item is _STOP:
+                break
+            request_id, session_id, audio, language = item
+            text, status = self.transcribe(audio, language)
+            self._finish(request_id, session_id, text, status)
+
+    # Forget transcripts and statuses for sessions that have gone away
+    def _prune(self):
+        cutoff = time.monotonic() - RESULT_TTL
+        for session_id in [s for s, r in self._results.items() if r[-1].created < cutoff]:
+            del self._results[session_id]
+        for session_id in [s for s, (_, updated) in self._status.items()
+                           if updated < cutoff and s not in self._pending]:
+            del self._status[session_id]
+
+    # Stop recording, let queued transcriptions finish (up to timeout) and
+    # stop both workers. Captures still waiting for the source are cancelled.
+    def close(self, timeout=5.0):
+        if not self._capture_worker.is_alive():
+            return
+        self._stop.set()
+        try:
+            self._captures.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Speech capture queue still full at shutdown")
+            return
+        self._capture_worker.join(timeout)
+        self._transcribe_worker.join(timeout)
@@ -0,0 +1,66 @@
+import time
+
+import audio_cache
+import tts_service
+
+
+class FakeEngine:
+    def __init__(self, name, format="audio/wav"):
+        self.name = name
+        self.format = format
+        self.calls = 0
+
+    def synthesize(self, text, lang="en"):
+        self.calls += 1
+        return f"{self.name}:{text}".encode("utf-8")
+
+
+def test_get_any_counts_one_lookup(tmp_path):
+    cache = audio_cache.AudioCache(str(tmp_path), 1024 * 1024)
+    cache.put("hello", "en", "fallback", b"clip")
+    assert cache.get_any("hello", "en", ["primary", "fallback"]) == ("fallback", b"clip")
+    assert cache.get_any("missing", "en", ["primary", "fallback"]) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+# A clip cached by the fallback engine used to count a miss for the primary
+# engine first, so one hit and one miss showed as a 33% hit rate
+def test_tts_counts_one_lookup_per_request(tmp_path):
+    cache = audio_cache.AudioCache(str(tmp_path), 1024 * 1024)
+    primary, fallback = FakeEngine("primary", "audio/mp3"), FakeEngine("fallback")
+    cache.put("cached", "en", "fallback", b"clip")
+    service = tts_service.TTSService(engines=[primary, fallback], cache=cache)
+    try:
+        assert service.synthesize("cached") == (b"clip", "audio/wav", None)
+        assert service.synthesize("new")[0] == b"primary:new"
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+        assert primary.calls == 1 and fallback.calls == 0
+    finally:
+        service.close()
+
+
+class SlowEngine(FakeEngine):
+    def synthesize(self, text, lang="en"):
+        time.sleep(0.2)
+        return super().synthesize(text, lang)
+
+
+# A cached sentence used to be delivered straight from submit(), ahead of an
+# earlier sentence still being synthesized
+def test_streamed_sentences_keep_their_order(tmp_path):
+    cache = audio_cache.AudioCache(str(tmp_path), 1024 * 1024)
+    first, second = "The first sentence of the answer.", "The second sentence, already cached."
+    cache.put(second, "en", "slow", b"cached clip")
+    service = tts_service.TTSService(engines=[SlowEngine("slow")], cache=cache)
+    try:
+        stream = tts_service.SentenceStream(service, "session")
+        stream.feed(f"{first} {second}")
+        stream.finish()
+        deadline = time.monotonic() + 5
+        while service.pending("session") and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [result.text for result in service.collect("session")] == [first, second]
+    finally:
+        service.close()
@@ -0,0 +1,114 @@
+import pytest
+
+import gemini_client
+
+
+class ApiError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+# Streams one chunk and then fails, as a dropped connection would
+class BrokenStreamChat:
+    def send_message(self, prompt, stream=False, request_options=None):
+        yield gemini_client.FakeResponse("Partial ")
+        raise ApiError(503)
+
+
+@pytest.fixture
+def sleeps():
+    return []
+
+
+def make_client(model, sleeps, **kwargs):
+    return gemini_client.GeminiClient(model, sleep=sleeps.append, **kwargs)
+
+
+def test_retries_429_and_5xx_then_succeeds(sleeps):
+    model = gemini_client.FakeModel(reply="Done", failures=[ApiError(429), ApiError(503)])
+    client = make_client(model, sleeps)
+    assert client.generate("Hello", call_type="test") == "Done"
+    assert len(model.prompts) == 3
+    assert len(sleeps) == 2
+    metrics = client.metrics()["test"]
+    assert (metrics["calls"], metrics["errors"], metrics["retries"]) == (1, 0, 2)
+
+
+def test_does_not_retry_other_errors(sleeps):
+    model = gemini_client.FakeModel(failures=[ApiError(400)])
+    client = make_client(model, sleeps)
+    with pytest.raises(gemini_client.GeminiError) as raised:
+        client.generate("Hello", call_type="test")
+    assert not isinstance(raised.value, gemini_client.GeminiUnavailable)
+    assert len(model.prompts) == 1 and sleeps == []
+    metrics = client.metrics()["test"]
+    assert (metrics["calls"], metrics["errors"], metrics["retries"]) == (1, 1, 0)
+
+
+# With the backoff at its upper bound, the second retry would end past the deadline
+def test_gives_up_at_the_deadline(sleeps, monkeypatch):
+    monkeypatch.setattr(gemini_client.random, "uniform", lambda low, high: high)
+    model = gemini_client.FakeModel(failures=[ApiError(503)] * 5)
+    client = make_client(model, sleeps, timeout=1.5)
+    with pytest.raises(gemini_client.GeminiUnavailable):
+        client.generate("Hello", call_type="test")
+    assert sleeps == [gemini_client.BACKOFF_BASE]
+    assert len(model.prompts) == 2
+
+
+def test_stream_retries_before_the_first_chunk(sleeps):
+    model = gemini_client.FakeModel(reply="One two three", failures=[ApiError(500)])
+    client = make_client(model, sleeps)
+    chat = client.start_chat([])
+    assert "".join(client.stream_message(chat, "Hello")) == "One two three "
+    assert len(sleeps) == 1
+    metrics = client.metrics()["chat_stream"]
+    assert (metrics["calls"], metrics["retries"]) == (1, 1)
+    assert metrics["p50_first_chunk"] is not None
+
+
+def test_stream_raises_once_text_was_yielded(sleeps):
+    client = make_client(gemini_client.FakeModel(), sleeps)
+    chunks = []
+    with pytest.raises(gemini_client.GeminiUnavailable):
+        for chunk in client.stream_message(BrokenStreamChat(), "Hello"):
+            chunks.append(chunk)
+    assert chunks == ["Partial "]
+    assert sleeps == []
+    metrics = client.metrics()["chat_stream"]
+    assert (metrics["calls"], metrics["errors"], metrics["retries"]) == (1, 1, 0)
+
+
+def test_metrics_count_each_call_type(sleeps):
+    client = make_client(gemini_client.FakeModel(reply="Fine"), sleeps)
+    client.generate("One", call_type="analysis")
+    client.generate("Two", call_type="analysis")
+    client.send_message(client.start_chat([]), "Three")
+    metrics = client.metrics()
+    assert metrics["analysis"]["calls"] == 2 and metrics["chat"]["calls"] == 1
+    assert metrics["analysis"]["mean_latency"] is not None
+    assert metrics["analysis"]["p50_latency"] == gemini_client.LATENCY_BUCKETS[0]
+
+
+def test_token_bucket_waits_with_the_injected_sleep(sleeps):
+    now = [0.0]
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = gemini_client.TokenBucket(rate=2.0, capacity=1, sleep=sleep, clock=lambda: now[0])
+    assert bucket.acquire(deadline=10.0) == 0.0
+    assert bucket.acquire(deadline=10.0) == pytest.approx(0.5)
+    assert sleeps == [pytest.approx(0.5)]
+    # The next token is due at 1.0, after this deadline
+    assert bucket.acquire(deadline=0.9) is None
+
+
+def test_throttled_calls_are_counted(sleeps):
+    client = make_client(gemini_client.FakeModel(), sleeps, requests_per_minute=6000, burst=1)
+    client.generate("One", call_type="test")
+    client.generate("Two", call_type="test")
+    assert client.metrics()["test"]["throttled"] == 1
+    assert sleeps
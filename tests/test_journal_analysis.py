@@ -0,0 +1,31 @@
+import journal_analysis
+import journal_db
+import write_queue
+
+
+# Summaries and the final analysis are saved through the write queue, and a
+# second run with no new entries is answered from what was saved
+def test_analysis_is_saved_through_the_writer(tmp_path):
+    pool = journal_db.ConnectionPool(str(tmp_path / "journal.db"), size=2)
+    writer = None
+    try:
+        journal_db.init_db(pool)
+        journal_db.insert_entry(pool, "2025-01-01 09:00:00", "First week", "🙂 Okay", "")
+        journal_db.insert_entry(pool, "2025-01-15 09:00:00", "Third week", "😄 Great", "")
+        writer = write_queue.WriteQueue(pool)
+        prompts = []
+
+        def generate(prompt):
+            prompts.append(prompt)
+            return f"summary {len(prompts)}"
+
+        analysis, stats = journal_analysis.analyze_journal(pool, writer, generate)
+        assert (analysis, stats) == ("summary 3", {"chunks": 2, "summarized": 2})
+        assert writer.stats()["writes"] == 3
+
+        assert journal_analysis.analyze_journal(pool, writer, generate)[0] == "summary 3"
+        assert len(prompts) == 3
+    finally:
+        if writer:
+            writer.close()
+        pool.close()
@@ -0,0 +1,127 @@
+import datetime
+import sqlite3
+
+import pytest
+
+import journal_db
+
+LEGACY_SCHEMA = """
+CREATE TABLE journal_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    mood TEXT NOT NULL,
+    tags TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def legacy_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.executemany("INSERT INTO journal_entries (timestamp, entry, mood, tags) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def test_migrates_legacy_db_with_duplicate_entries(tmp_path):
+    path = str(tmp_path / "journal.db")
+    entry = ("2025-01-01 09:00:00", "Same words twice", "🙂 Okay", "study")
+    legacy_db(path, [entry, entry, ("2025-01-02 09:00:00", "Something else", "😄 Great", "")])
+    pool = journal_db.ConnectionPool(path, size=1)
+    try:
+        journal_db.init_db(pool)
+        # Nothing is deleted; only the first copy carries the hash
+        assert journal_db.count_entries(pool) == 3
+        with pool.connection() as conn:
+            hashes = conn.execute("SELECT id, content_hash FROM journal_entries ORDER BY id").fetchall()
+        assert hashes[0][1] == journal_db.entry_hash(*entry)
+        assert hashes[1][1] is None
+        assert hashes[2][1] is not None
+        # The unique index still stops the entry being saved a third time
+        assert journal_db.insert_entry(pool, *entry) is None
+        assert journal_db.get_streaks(pool, datetime.date(2025, 1, 2)) == (2, 2)
+    finally:
+        pool.close()
+
+
+def test_init_db_applies_every_migration_once(tmp_path):
+    pool = journal_db.ConnectionPool(str(tmp_path / "journal.db"), size=1)
+    try:
+        journal_db.init_db(pool)
+        journal_db.init_db(pool)
+        with pool.connection() as conn:
+            versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert versions == [version for version, _, _ in journal_db.MIGRATIONS]
+        assert {"journal_entries", "chat_sessions", "chat_messages"} <= tables
+    finally:
+        pool.close()
+
+
+def test_refuses_a_newer_schema(tmp_path):
+    pool = journal_db.ConnectionPool(str(tmp_path / "journal.db"), size=1)
+    try:
+        journal_db.init_db(pool)
+        with pool.transaction() as conn:
+            conn.execute("INSERT INTO schema_version (version, description) VALUES (99, 'from the future')")
+        with pytest.raises(RuntimeError, match="newer"):
+            journal_db.init_db(pool)
+    finally:
+        pool.close()
+
+
+def streak_row(pool):
+    with pool.connection() as conn:
+        return conn.execute(journal_db.SELECT_STREAK_STATS).fetchone()
+
+
+# Days are entered in the given order; expected is (current, longest) on
+# 2025-01-10. The incremental rollup must match a rebuild from scratch.
+@pytest.mark.parametrize("days, expected", [
+    ([9, 9], (1, 1)),  # Another entry on the same day
+    ([8, 9], (2, 2)),  # The next day
+    ([1, 2, 3, 8, 9], (2, 3)),  # After a gap
+    ([5, 6, 8, 9, 7], (5, 5)),  # Back-dated, joining two streaks
+    ([9, 10, 3], (2, 2)),  # Back-dated, on its own
+])
+def test_incremental_streaks_match_a_rebuild(tmp_path, days, expected):
+    pool = journal_db.ConnectionPool(str(tmp_path / "journal.db"), size=1)
+    try:
+        journal_db.init_db(pool)
+        for i, day in enumerate(days):
+            journal_db.insert_entry(pool, f"2025-01-{day:02d} 0{i}:00:00", f"Entry {i}", "🙂 Okay", "")
+        assert journal_db.get_streaks(pool, datetime.date(2025, 1, 10)) == expected
+        incremental = streak_row(pool)
+        journal_db.refresh_activity(pool)
+        assert streak_row(pool) == incremental
+    finally:
+        pool.close()
+
+
+def test_current_streak_lapses_after_yesterday(tmp_path):
+    pool = journal_db.ConnectionPool(str(tmp_path / "journal.db"), size=1)
+    try:
+        journal_db.init_db(pool)
+        for day in (1, 2, 3):
+            journal_db.insert_entry(pool, f"2025-01-0{day} 09:00:00", "Entry", "🙂 Okay", "")
+        assert journal_db.get_streaks(pool, datetime.date(2025, 1, 3)) == (3, 3)
+        assert journal_db.get_streaks(pool, datetime.date(2025, 1, 4)) == (3, 3)
+        assert journal_db.get_streaks(pool, datetime.date(2025, 1, 5)) == (0, 3)
+    finally:
+        pool.close()
+
+
+def test_exhausted_pool_raises_a_descriptive_error(tmp_path):
+    pool = journal_db.ConnectionPool(str(tmp_path / "journal.db"), size=1, timeout=0.05)
+    try:
+        with pool.connection():
+            with pytest.raises(RuntimeError, match="No database connection available after 0.05s"):
+                with pool.connection():
+                    pass
+        # The held connection went back to the pool
+        with pool.connection() as conn:
+            assert conn.execute("SELECT 1").fetchone() == (1,)
+    finally:
+        pool.close()
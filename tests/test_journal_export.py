@@ -0,0 +1,71 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+
+import pytest
+
+import journal_db
+import journal_export
+import journal_import
+
+ENTRIES = [
+    ("2025-01-01 09:00:00", "New year, new notebook.\n\n## Not a section\nStill the entry.", "😄 Great",
+     "goals, study", "A hopeful start."),
+    ("2025-01-02 21:30:00", 'Commas, "quotes" and\nnewlines survive.', "🙂 Okay", "", None),
+    ("2025-01-03 07:15:00", "Short one.", "😔 Low", "sleep", None),
+]
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = journal_db.ConnectionPool(str(tmp_path / "journal.db"), size=1)
+    journal_db.init_db(pool)
+    for timestamp, entry, mood, tags, reflection in ENTRIES:
+        journal_db.insert_entry(pool, timestamp, entry, mood, tags, reflection)
+    yield pool
+    pool.close()
+
+
+# Read an export back as (timestamp, entry, mood, tags, reflection) rows
+def read_back(fmt, text):
+    if fmt == "md":
+        return list(journal_import.parse_entries(io.StringIO(text)))
+    if fmt == "jsonl":
+        records = [json.loads(line) for line in text.splitlines()]
+    else:
+        records = list(csv.DictReader(io.StringIO(text, newline="")))
+    return [(r["timestamp"], r["entry"], r["mood"], r["tags"] or "", r["reflection"] or None) for r in records]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+@pytest.mark.parametrize("fmt", journal_export.FORMATS)
+def test_export_round_trip(pool, fmt, compress):
+    f = io.BytesIO()
+    # A small batch size so the export is written in several pieces
+    journal_export.write_export(pool, f, fmt, compress=compress, batch_size=2)
+    data = gzip.decompress(f.getvalue()) if compress else f.getvalue()
+    assert read_back(fmt, data.decode("utf-8")) == ENTRIES
+
+
+def test_markdown_export_imports_into_a_new_journal(pool, tmp_path):
+    export_dir = tmp_path / "journal"
+    export_dir.mkdir()
+    with open(export_dir / "journal_export.md", "wb") as f:
+        journal_export.write_export(pool, f, "md")
+
+    other = journal_db.ConnectionPool(str(tmp_path / "other.db"), size=1)
+    try:
+        journal_db.init_db(other)
+        stats = journal_import.import_directory(other, str(export_dir))
+        assert (stats["parsed"], stats["inserted"]) == (3, 3)
+        assert journal_db.get_streaks(other, datetime.date(2025, 1, 3)) == (3, 3)
+    finally:
+        other.close()
+
+
+def test_empty_csv_export_has_a_header(pool):
+    f = io.BytesIO()
+    journal_export.write_export(pool, f, "csv", mood="No such mood")
+    assert f.getvalue().decode("utf-8").strip() == ",".join(journal_export.CSV_COLUMNS)
@@ -0,0 +1,59 @@
+import io
+
+import journal_db
+import journal_import
+
+
+def parse(text):
+    return list(journal_import.parse_entries(io.StringIO(text)))
+
+
+def test_parses_an_entry_with_every_section():
+    assert parse(
+        "# Journal Entry - 2025-04-10 14:51:42\n\n"
+        "## Mood\n😄 Great\n\n"
+        "## Tags\nstudy, focus\n\n"
+        "## Your Entry\nFinished the chapter.\n\n### Notes\nA heading inside the entry.\n\n"
+        "## Gemini Reflection\nNice work.\n"
+    ) == [("2025-04-10 14:51:42", "Finished the chapter.\n\n### Notes\nA heading inside the entry.",
+           "😄 Great", "study, focus", "Nice work.")]
+
+
+def test_parses_several_entries_with_windows_line_endings():
+    text = ("# Journal Entry - 2025-04-10 08:00:00\r\n## Mood\r\n🙂 Okay\r\n## Your Entry\r\nMorning.\r\n"
+            "# Journal Entry - 2025-04-10 20:00:00\r\n## Your Entry\r\nEvening.\r\n")
+    assert parse(text) == [
+        ("2025-04-10 08:00:00", "Morning.", "🙂 Okay", "", None),
+        # A missing mood is filled in rather than dropping the entry
+        ("2025-04-10 20:00:00", "Evening.", journal_import.UNKNOWN_MOOD, "", None),
+    ]
+
+
+def test_skips_malformed_entries():
+    text = ("Stray text before any entry\n"
+            "# Journal Entry - yesterday evening\n## Your Entry\nNo usable timestamp.\n"
+            "# Journal Entry - 2025-04-11 09:00:00\n## Mood\n😔 Low\n## Your Entry\n\n"
+            "# Journal Entry - 2025-04-12 09:00:00\n## Your Entry\nKept.\n")
+    assert parse(text) == [("2025-04-12 09:00:00", "Kept.", journal_import.UNKNOWN_MOOD, "", None)]
+
+
+def test_imports_a_directory_once(tmp_path):
+    journal_dir = tmp_path / "journal"
+    journal_dir.mkdir()
+    # Files saved on Windows may start with a byte order mark
+    (journal_dir / "journal_1.md").write_text(
+        "# Journal Entry - 2025-04-10 09:00:00\n## Your Entry\nFirst.\n", encoding="utf-8-sig")
+    (journal_dir / "journal_2.md").write_text(
+        "# Journal Entry - 2025-04-11 09:00:00\n## Your Entry\nSecond.\n", encoding="utf-8")
+    (journal_dir / "notes.txt").write_text("Not a journal file", encoding="utf-8")
+
+    pool = journal_db.ConnectionPool(str(tmp_path / "journal.db"), size=1)
+    try:
+        journal_db.init_db(pool)
+        stats = journal_import.import_directory(pool, str(journal_dir), batch_size=1)
+        assert (stats["parsed"], stats["inserted"], stats["duplicates"]) == (2, 2, 0)
+        stats = journal_import.import_directory(pool, str(journal_dir))
+        assert (stats["parsed"], stats["inserted"], stats["duplicates"]) == (2, 0, 2)
+        assert journal_db.count_entries(pool) == 2
+    finally:
+        pool.close()
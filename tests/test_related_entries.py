@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+import related_entries
+
+
+def make_index(*texts):
+    index = related_entries.RelatedEntriesIndex()
+    for entry_id, text in enumerate(texts, start=1):
+        index.add(entry_id, text)
+    return index
+
+
+def test_similar_batch_ranks_overlapping_entries():
+    index = make_index("studied the audit chapter", "audit chapter revision notes", "dinner with friends")
+    related = index.similar_batch([1], k=2)
+    assert [entry_id for entry_id, _ in related[1]] == [2]
+
+
+# Regression: an entry without a single indexable token used to divide by
+# zero when picking the scoring block size
+@pytest.mark.parametrize("text", ["", "I am 22"])
+def test_similar_batch_with_no_indexable_terms(text):
+    index = make_index("studied the audit chapter", text)
+    assert index.similar_batch([2]) == {2: []}
+    assert index.similar_to_entry(2) == []
@@ -0,0 +1,51 @@
+import array
+import math
+import wave
+
+import stt_service
+
+SAMPLE_RATE = 16000
+
+
+# Write a mono 16-bit WAV from (seconds, amplitude) parts: a 440 Hz tone, or
+# silence for amplitude 0
+def write_wav(path, parts):
+    samples = array.array("h")
+    for seconds, amplitude in parts:
+        samples.extend(int(amplitude * math.sin(2 * math.pi * 440 * i / SAMPLE_RATE))
+                       for i in range(int(seconds * SAMPLE_RATE)))
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(samples.tobytes())
+
+
+# Calibrating while someone is already talking used to set a threshold above
+# their own voice
+def test_calibration_over_speech_is_capped(tmp_path):
+    path = tmp_path / "talking.wav"
+    write_wav(path, [(0.5, 10000), (1.0, 8000), (1.0, 0)])
+    service = stt_service.SpeechCaptureService(stt_service.WavFileSource(str(path)), stt_service.StubEngine(),
+                                               listen_timeout=1.0)
+    try:
+        audio = service.capture()
+        assert audio is not None and audio.seconds >= 1.0
+    finally:
+        service.close()
+
+
+# A calibration that hears nothing is dropped, so the next recording
+# calibrates again instead of reusing a threshold that is too high
+def test_no_speech_recalibrates(tmp_path):
+    path = tmp_path / "mic.wav"
+    source = stt_service.WavFileSource(str(path))
+    service = stt_service.SpeechCaptureService(source, stt_service.StubEngine(), listen_timeout=1.0)
+    try:
+        write_wav(path, [(0.5, 2000), (1.5, 0)])
+        assert service.capture() is None
+
+        write_wav(path, [(0.5, 0), (1.0, 1500), (1.0, 0)])
+        assert service.capture() is not None
+    finally:
+        service.close()
@@ -0,0 +1,119 @@
+import sqlite3
+import threading
+
+import pytest
+
+import journal_db
+import write_queue
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = journal_db.ConnectionPool(str(tmp_path / "writes.db"), size=2)
+    with pool.transaction() as conn:
+        conn.execute("CREATE TABLE items (value TEXT UNIQUE)")
+    yield pool
+    pool.close()
+
+
+def add(conn, value):
+    return conn.execute("INSERT INTO items (value) VALUES (?)", (value,)).lastrowid
+
+
+def add_then_fail(conn, value):
+    add(conn, value)
+    raise ValueError(f"{value} is not wanted")
+
+
+def stored(pool):
+    with pool.connection() as conn:
+        return [row[0] for row in conn.execute("SELECT value FROM items ORDER BY rowid")]
+
+
+# Holds the writer inside its first write until released, so the writes
+# submitted meanwhile queue up behind it
+def block_writer(writer):
+    started, release = threading.Event(), threading.Event()
+
+    def wait(conn):
+        started.set()
+        release.wait(5)
+    writer.submit(wait)
+    assert started.wait(5)
+    return release
+
+
+def test_queued_writes_commit_as_one_group(pool):
+    writer = write_queue.WriteQueue(pool)
+    try:
+        release = block_writer(writer)
+        futures = [writer.submit(add, f"item {i}") for i in range(5)]
+        release.set()
+        assert [future.result(5) for future in futures] == [1, 2, 3, 4, 5]
+        stats = writer.stats()
+        assert (stats["writes"], stats["commits"], stats["largest_batch"]) == (6, 2, 5)
+    finally:
+        writer.close()
+
+
+def test_a_failed_write_rolls_back_alone(pool):
+    writer = write_queue.WriteQueue(pool)
+    try:
+        release = block_writer(writer)
+        first = writer.submit(add, "first")
+        failing = writer.submit(add_then_fail, "unwanted")
+        last = writer.submit(add, "last")
+        release.set()
+        assert first.result(5) and last.result(5)
+        with pytest.raises(ValueError, match="not wanted"):
+            failing.result(5)
+        assert stored(pool) == ["first", "last"]
+        stats = writer.stats()
+        assert (stats["failed"], stats["commits"]) == (1, 2)
+    finally:
+        writer.close()
+
+
+def test_write_returns_the_result_or_raises(pool):
+    writer = write_queue.WriteQueue(pool)
+    try:
+        assert writer.write(add, "one") == 1
+        with pytest.raises(sqlite3.IntegrityError):
+            writer.write(add, "one")
+    finally:
+        writer.close()
+
+
+def test_flush_waits_for_earlier_writes(pool):
+    writer = write_queue.WriteQueue(pool)
+    try:
+        for i in range(20):
+            writer.submit(add, f"item {i}")
+        writer.flush()
+        assert len(stored(pool)) == 20
+    finally:
+        writer.close()
+
+
+def test_close_commits_pending_writes(pool):
+    writer = write_queue.WriteQueue(pool)
+    release = block_writer(writer)
+    futures = [writer.submit(add, f"item {i}") for i in range(10)]
+    threading.Timer(0.1, release.set).start()
+    writer.close()
+    assert all(future.done() for future in futures)
+    assert len(stored(pool)) == 10
+    with pytest.raises(RuntimeError):
+        writer.submit(add, "too late")
+
+
+def test_submit_raises_when_the_queue_is_full(pool):
+    writer = write_queue.WriteQueue(pool, queue_size=1)
+    try:
+        release = block_writer(writer)
+        writer.submit(add, "queued")
+        with pytest.raises(write_queue.WriteQueueFull):
+            writer.submit(add, "no room", timeout=0.05)
+        release.set()
+    finally:
+        writer.close()
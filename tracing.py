@@ -0,0 +1,206 @@
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+
+# === TRACING ===
+# Lightweight spans for finding where a slow page spends its time: tab
+# sections, database queries, Gemini calls and speech. Off by default; while
+# disabled, span() returns a shared no-op context manager and traced
+# functions cost one flag check, so instrumentation can stay in place.
+#
+# When enabled, every finished span is appended as one JSON line to a
+# rotating log, and spans started on a thread with an active run (the
+# Streamlit script thread, between start_run and finish_run) are also
+# collected for that run's timing breakdown. Spans nest per thread.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+
+_enabled = False
+_log = None
+_configure_lock = threading.Lock()
+_local = threading.local()
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def enabled():
+    return _enabled
+
+
+# Turn tracing on or off for the process. Spans go to a rotating JSONL file
+# at log_path (if given). Safe to call on every rerun.
+def configure(enable, log_path=None, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS):
+    global _enabled, _log
+    with _configure_lock:
+        if enable and log_path and (_log is None or _log.baseFilename != os.path.abspath(log_path)):
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+            if _log is not None:
+                _log.close()
+            _log = logging.handlers.RotatingFileHandler(log_path, maxBytes=max_bytes,
+                                                        backupCount=backups, encoding="utf-8")
+        elif not enable and _log is not None:
+            _log.close()
+            _log = None
+        _enabled = enable
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _finish(record):
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run["spans"].append(record)
+        record["run_id"] = run["id"]
+    if _log is not None:
+        try:
+            _log.handle(logging.makeLogRecord({"msg": json.dumps(record, ensure_ascii=False, default=str)}))
+        except Exception as e:
+            logger.warning("Could not write span: %s", e)
+
+
+class Span:
+    def __init__(self, name, category, attrs):
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+
+    def __enter__(self):
+        stack = _stack()
+        self.depth = len(stack)
+        self.parent = stack[-1].category if stack else None
+        stack.append(self)
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._t0
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        record = {
+            "name": self.name,
+            "category": self.category,
+            "start": self.start,
+            "duration_ms": duration * 1000,
+            "depth": self.depth,
+            "parent_category": self.parent,
+            "thread": threading.current_thread().name,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        record.update(self.attrs)
+        _finish(record)
+        return False
+
+    # Attach more attributes while the span is open
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+# Time a block: `with tracing.span("chat.stream", "ui") as s:`. `s` is None
+# while tracing is disabled.
+def span(name, category="app", **attrs):
+    if not _enabled:
+        return _NOOP
+    return Span(name, category, attrs)
+
+
+# Record a span measured elsewhere, e.g. a duration a client already tracks
+def record(name, category, duration, **attrs):
+    if not _enabled:
+        return
+    stack = _stack()
+    entry = {
+        "name": name,
+        "category": category,
+        "start": time.time() - duration,
+        "duration_ms": duration * 1000,
+        "depth": len(stack),
+        "parent_category": stack[-1].category if stack else None,
+        "thread": threading.current_thread().name,
+    }
+    entry.update(attrs)
+    _finish(entry)
+
+
+# Decorator tracing every call of a function as a span named module.function.
+# For generator functions the span covers the whole iteration, recorded once
+# it finishes so it doesn't swallow the caller's spans in between.
+def traced(category="app", name=None):
+    def decorate(fn):
+        span_name = name or f"{fn.__module__}.{fn.__name__}"
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return (yield from fn(*args, **kwargs))
+                start = time.perf_counter()
+                count = 0
+                try:
+                    for item in fn(*args, **kwargs):
+                        count += 1
+                        yield item
+                finally:
+                    record(span_name, category, time.perf_counter() - start, items=count)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(span_name, category, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# === PER-RUN COLLECTION ===
+def start_run(run_id=None):
+    if not _enabled:
+        return
+    _local.run = {"id": run_id or f"{time.time():.6f}", "spans": [], "start": time.perf_counter()}
+    _local.stack = []
+
+
+# Stop collecting for this thread. Returns (total seconds, [span dicts in
+# start order]) or None if no run was active.
+def finish_run():
+    run = getattr(_local, "run", None)
+    _local.run = None
+    if run is None:
+        return None
+    return time.perf_counter() - run["start"], sorted(run["spans"], key=lambda s: s["start"])
+
+
+# Total milliseconds per category, largest first. A span inside another of
+# the same category is already part of its parent's time, so it is skipped.
+def totals_by_category(spans):
+    totals = {}
+    for s in spans:
+        if s["parent_category"] != s["category"]:
+            totals[s["category"]] = totals.get(s["category"], 0.0) + s["duration_ms"]
+    return sorted(totals.items(), key=lambda item: -item[1])
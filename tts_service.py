@@ -0,0 +1,252 @@
+import collections
+import io
+import itertools
+import logging
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+
+import tracing
+from lazy_imports import timed_import
+
+# === TEXT-TO-SPEECH SERVICE ===
+# One TTSService per process (the app creates it through st.cache_resource).
+# Sessions submit text and the single worker thread synthesizes it; finished
+# audio is parked per session until that session's next script run collects
+# it, because a background thread can't draw into a Streamlit page.
+
+logger = logging.getLogger(__name__)
+
+# Pending requests across all sessions; submit() refuses new work beyond this
+DEFAULT_QUEUE_SIZE = 16
+# Finished clips kept per session; older ones are dropped if never collected.
+# A streamed answer delivers one clip per sentence, so this allows for a few
+# seconds of sentences between polls.
+MAX_RESULTS_PER_SESSION = 50
+# Sessions that haven't collected their audio for this long are forgotten
+RESULT_TTL = 600.0
+
+_STOP = object()
+
+
+class TTSQueueFull(Exception):
+    pass
+
+
+class GTTSEngine:
+    name = "gtts"
+    format = "audio/mp3"
+
+    def synthesize(self, text, lang="en"):
+        gtts = timed_import("gtts")
+        fp = io.BytesIO()
+        gtts.gTTS(text=text, lang=lang).write_to_fp(fp)
+        return fp.getvalue()
+
+
+# Offline engine, used when gTTS can't reach Google. pyttsx3 engines are not
+# thread-safe, so it is only ever driven from the service's worker thread.
+class Pyttsx3Engine:
+    name = "pyttsx3"
+    format = "audio/wav"
+
+    def __init__(self):
+        self._engine = None
+
+    def synthesize(self, text, lang="en"):
+        if self._engine is None:
+            self._engine = timed_import("pyttsx3").init()
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            self._engine.save_to_file(text, path)
+            self._engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+# clip_id is unique per delivery, so the browser player can tell a replay of
+# the same text from a clip it has already queued
+TTSResult = collections.namedtuple("TTSResult", "clip_id text audio format error created")
+_clip_ids = itertools.count(1)
+
+
+class TTSService:
+    def __init__(self, engines=None, queue_size=DEFAULT_QUEUE_SIZE, cache=None):
+        self.engines = engines or [GTTSEngine(), Pyttsx3Engine()]
+        self.cache = cache
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._results = {}
+        self._pending = collections.Counter()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="tts-worker", daemon=True)
+        self._worker.start()
+
+    # Queue text for synthesis. Raises TTSQueueFull instead of blocking the
+    # caller's script run when the worker is already backed up, unless block is
+    # set, in which case it waits up to timeout for room.
+    def submit(self, session_id, text, lang="en", block=False, timeout=None):
+        if not text:
+            return
+        if not self._worker.is_alive():
+            raise RuntimeError("TTS service is shut down")
+        # Cached text goes through the queue too (the worker answers it from
+        # the cache), so it can't overtake sentences queued before it
+        with self._lock:
+            self._pending[session_id] += 1
+        try:
+            self._queue.put((session_id, text, lang), block=block, timeout=timeout)
+        except queue.Full:
+            self._done(session_id)
+            raise TTSQueueFull("Too many pending speech requests, try again in a moment")
+
+    def pending(self, session_id):
+        with self._lock:
+            return self._pending[session_id]
+
+    # Take every finished clip for this session, oldest first
+    def collect(self, session_id):
+        with self._lock:
+            results = self._results.pop(session_id, None)
+        return list(results) if results else []
+
+    # Returns (audio, format) from the first engine with a cached clip, or None.
+    # One lookup covers every engine, so a request counts as one hit or miss.
+    def _cached(self, text, lang):
+        if self.cache is None:
+            return None
+        found = self.cache.get_any(text, lang, [engine.name for engine in self.engines])
+        if not found:
+            return None
+        name, audio = found
+        return audio, next(engine.format for engine in self.engines if engine.name == name)
+
+    def synthesize(self, text, lang="en"):
+        cached = self._cached(text, lang)
+        if cached:
+            return cached[0], cached[1], None
+        return self._synthesize_uncached(text, lang)
+
+    # Try each engine in turn, caching whatever the first working one produces
+    def _synthesize_uncached(self, text, lang):
+        error = None
+        for engine in self.engines:
+            try:
+                with tracing.span("tts.synthesize", "speech", engine=engine.name, chars=len(text)):
+                    audio = engine.synthesize(text, lang)
+            except Exception as e:
+                logger.warning("TTS engine %s failed: %s", engine.name, e)
+                error = e
+                continue
+            if self.cache is not None:
+                self.cache.put(text, lang, engine.name, audio)
+            return audio, engine.format, None
+        return None, None, error
+
+    def _deliver(self, session_id, text, audio, audio_format, error):
+        result = TTSResult(next(_clip_ids), text, audio, audio_format, error, time.monotonic())
+        with self._lock:
+            results = self._results.setdefault(
+                session_id, collections.deque(maxlen=MAX_RESULTS_PER_SESSION))
+            results.append(result)
+            self._prune()
+
+    def _done(self, session_id):
+        with self._lock:
+            self._pending[session_id] -= 1
+            if not self._pending[session_id]:
+                del self._pending[session_id]
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            session_id, text, lang = item
+            audio, audio_format, error = self.synthesize(text, lang)
+            self._deliver(session_id, text, audio, audio_format, error)
+            self._done(session_id)
+
+    # Forget clips for sessions that have gone away without collecting them
+    def _prune(self):
+        cutoff = time.monotonic() - RESULT_TTL
+        for session_id in [s for s, r in self._results.items() if r[-1].created < cutoff]:
+            del self._results[session_id]
+
+    # Finish queued work (up to timeout) and stop the worker
+    def close(self, timeout=5.0):
+        if not self._worker.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("TTS queue still full at shutdown, dropping pending requests")
+            return
+        self._worker.join(timeout)
+
+
+# === SENTENCE STREAMING ===
+# Splits a streamed model response into sentences as the chunks arrive and
+# queues each one for synthesis straight away, so speech can start after the
+# first sentence instead of after the whole answer. Every request, cached or
+# not, goes through the single FIFO worker, so a session's clips come back in
+# the order they were spoken.
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+MARKDOWN_NOISE = re.compile(r"[*_`#>|]+")
+
+# Fragments shorter than this (e.g. "1." from a numbered list) are held back
+# and joined with the next sentence
+MIN_SENTENCE_CHARS = 20
+
+
+def clean_for_speech(text):
+    return " ".join(MARKDOWN_NOISE.sub("", text).split())
+
+
+class SentenceStream:
+    def __init__(self, service, session_id, lang="en", timeout=10.0):
+        self.service = service
+        self.session_id = session_id
+        self.lang = lang
+        self.timeout = timeout
+        self._buffer = ""
+        self.sentences = 0
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        parts = SENTENCE_END.split(self._buffer)
+        # The last part may still be an unfinished sentence
+        self._buffer = parts.pop()
+        pending = ""
+        for part in parts:
+            pending = f"{pending} {part}" if pending else part
+            if len(pending.strip()) >= MIN_SENTENCE_CHARS:
+                self._speak(pending)
+                pending = ""
+        if pending:
+            self._buffer = f"{pending} {self._buffer}"
+
+    # Speak whatever is left once the response has finished streaming
+    def finish(self):
+        if self._buffer.strip():
+            self._speak(self._buffer)
+        self._buffer = ""
+
+    def _speak(self, sentence):
+        sentence = clean_for_speech(sentence)
+        if not sentence:
+            return
+        # Blocking here slows the response loop down to the speed of the
+        # worker rather than dropping sentences from the middle of an answer
+        try:
+            self.service.submit(self.session_id, sentence, self.lang, block=True, timeout=self.timeout)
+        except TTSQueueFull:
+            logger.warning("TTS queue stayed full, skipping a sentence")
+            return
+        self.sentences += 1
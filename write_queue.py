@@ -0,0 +1,144 @@
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+
+import tracing
+
+# === WRITE QUEUE ===
+# One writer thread per process (the app creates it through st.cache_resource)
+# owns every write to the journal database. Sessions queue writes instead of
+# each opening its own transaction, so they never contend for SQLite's write
+# lock. The writer takes everything queued so far (up to max_batch writes) and
+# commits it as one transaction: while one group is committing the next one
+# collects, so a burst of saves costs one commit rather than one each.
+#
+# A write is a function taking a connection, e.g. journal_db.write_entry.
+# Each runs in its own savepoint, so a failing write is rolled back and
+# reported on its future without taking the rest of its group with it.
+# Futures complete once their group has committed.
+
+logger = logging.getLogger(__name__)
+
+# Writes waiting across all sessions; submit() waits for room beyond this
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_MAX_BATCH = 200
+
+_STOP = object()
+
+
+class WriteQueueFull(Exception):
+    pass
+
+
+class WriteQueue:
+    def __init__(self, pool, queue_size=DEFAULT_QUEUE_SIZE, max_batch=DEFAULT_MAX_BATCH):
+        self.pool = pool
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._stats = {"writes": 0, "failed": 0, "commits": 0, "largest_batch": 0}
+        self._worker = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._worker.start()
+
+    # Queue fn(conn, *args, **kwargs) and return a Future for its result. Waits
+    # up to timeout for room when the queue is full, then raises WriteQueueFull.
+    def submit(self, fn, *args, timeout=5.0, **kwargs):
+        if self._closed or not self._worker.is_alive():
+            raise RuntimeError("Write queue is shut down")
+        future = concurrent.futures.Future()
+        try:
+            self._queue.put((future, fn, args, kwargs), timeout=timeout)
+        except queue.Full:
+            raise WriteQueueFull("Too many pending saves, try again in a moment")
+        return future
+
+    # Submit and wait for the write to commit. Returns its result or raises
+    # whatever it raised.
+    def write(self, fn, *args, timeout=30.0, **kwargs):
+        return self.submit(fn, *args, **kwargs).result(timeout)
+
+    # Wait until everything queued before this call has been committed
+    def flush(self, timeout=30.0):
+        self.write(lambda conn: None, timeout=timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats, pending=self._queue.qsize())
+
+    # Block for the next write, then take whatever else is already waiting
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch and batch[-1] is not _STOP:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            if batch:
+                self._commit(batch)
+            if stop:
+                break
+
+    def _commit(self, batch):
+        # A write whose future was cancelled before the writer got to it is
+        # skipped; one whose caller only stopped waiting still runs
+        batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        results = []
+        start = time.perf_counter()
+        try:
+            with self.pool.transaction() as conn:
+                for future, fn, args, kwargs in batch:
+                    conn.execute("SAVEPOINT queued_write")
+                    try:
+                        result = fn(conn, *args, **kwargs)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO queued_write")
+                        results.append((future, None, e))
+                    else:
+                        results.append((future, result, None))
+                    conn.execute("RELEASE queued_write")
+        except Exception as e:
+            # BEGIN or COMMIT failed, so nothing in the group was saved
+            logger.warning("Write group of %d failed to commit: %s", len(batch), e)
+            results = [(future, None, e) for future, _, _, _ in batch]
+        tracing.record("write_queue.commit", "db", time.perf_counter() - start, writes=len(batch))
+
+        failed = 0
+        for future, result, error in results:
+            if error is not None:
+                failed += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        with self._stats_lock:
+            self._stats["writes"] += len(batch)
+            self._stats["failed"] += failed
+            self._stats["commits"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+
+    # Stop accepting writes, commit everything still queued (waiting up to
+    # timeout) and stop the writer
+    def close(self, timeout=10.0):
+        if self._closed:
+            return
+        self._closed = True
+        if not self._worker.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Write queue still full at shutdown, %d writes not saved", self._queue.qsize())
+            return
+        self._worker.join(timeout)